@@ -1,4 +1,5 @@
 from datetime import datetime
+import asyncio
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,7 +14,7 @@ from shared.db import language_db
 from .core import middleware
 from .core.config import settings, setup_logging
 from .router.api_router import oj_router
-from .utils import user_tool
+from .utils import user_tool, judge_tool
 
 # set the redis for the api and arq
 redis_settings = RedisSettings(host=settings.redis_host)
@@ -32,7 +33,8 @@ async def lifespan(app: FastAPI):
     # init the cache
     FastAPICache.init(RedisBackend(redis), prefix='fastapi-cache')
 
-    # init the languages
+    # init the languages and keep their cache coherent with the other nodes
+    language_listener = asyncio.create_task(language_db.listen_language_changes(redis))
     await language_db.init_lan_in_redis(redis)
 
     # record the start up time of the api
@@ -47,6 +49,9 @@ async def lifespan(app: FastAPI):
     yield
 
     print('shutting down')
+    await judge_tool.stop_bulk_rejudges()
+    language_listener.cancel()
+    await asyncio.gather(language_listener, return_exceptions=True)
     await Tortoise.close_connections()
 
 def create_app() -> FastAPI:
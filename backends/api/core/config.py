@@ -18,6 +18,17 @@ class Settings:
         self.secure = os.getenv("SECURE", "False").lower == "true"
         self.frontend_url = os.getenv("FRONTEND_URL", "http://127.0.0.1:5173")
 
+        # a judge job is ranked as if it had been queued this many seconds
+        # earlier, so the live submissions go before the rejudges, which go
+        # before the bulk jobs, while the older jobs are never starved
+        self.live_headstart = int(os.getenv("LIVE_HEADSTART", 600))
+        self.rejudge_headstart = int(os.getenv("REJUDGE_HEADSTART", 60))
+        # the consecutive jobs of a user in a lane are ranked this many seconds
+        # apart, about the time to judge one, so the other users go in between
+        self.fair_share_quantum = int(os.getenv("FAIR_SHARE_QUANTUM", 10))
+        # the judge jobs enqueued per second by a bulk rejudge
+        self.bulk_rejudge_rate = int(os.getenv("BULK_REJUDGE_RATE", 20))
+
         if not self.secret_key:
             raise ValueError("Please set your jwt secret key")
         
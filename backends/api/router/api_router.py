@@ -8,6 +8,7 @@ from .endpoints import (
     reset,
     export,
     import_data,
+    judge,
 )
 
 oj_router = APIRouter(prefix='/api')
@@ -19,3 +20,4 @@ oj_router.include_router(submissions.router)
 oj_router.include_router(reset.router)
 oj_router.include_router(export.router)
 oj_router.include_router(import_data.router)
+oj_router.include_router(judge.router)
@@ -14,7 +14,10 @@ async def export_data(current_user = Depends(auth.get_current_user_admin_only)):
     users = await user_db.export_user_table()
     user_data = [user_parse.user_to_user_data(user) for user in users]
     problems = await problem_db.export_problem_table()
-    problem_data = [problem_parse.problem_to_problem_schema(problem) for problem in problems]
+    problem_data = [
+        problem_parse.problem_to_problem_schema(problem, await problem_db.get_testcases(problem))
+        for problem in problems
+    ]
     languages = await language_db.export_language_table()
     language_data = [language_parse.language_to_language_schema(language) for language in languages]
     submissions = await submission_db.export_submission_table()
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi_cache import FastAPICache
+from arq import ArqRedis
+from api.core.security import auth
+from api.utils import judge_tool
+from shared.models import User
+from shared.schemas import BulkRejudgeModel
+from shared.db import submission_db
+
+router = APIRouter(prefix='/judge')
+
+@router.get('/queue')
+async def get_queue_depths(current_user: User = Depends(auth.get_current_user_admin_only)):
+
+    """get the number of judge jobs waiting in each lane"""
+
+    redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
+    return {
+        'code': status.HTTP_200_OK,
+        'msg': 'success',
+        'data': await judge_tool.lane_depths(redis),
+    }
+
+@router.post('/rejudges')
+async def bulk_rejudge(
+    filters: BulkRejudgeModel,
+    current_user: User = Depends(auth.get_current_user_admin_only),
+):
+
+    """rejudge the submissions selected by the filters in the bulk lane"""
+
+    if not filters.model_dump(exclude_none=True):
+        # rejudging every submission must not happen by accident
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'code': status.HTTP_400_BAD_REQUEST,
+                'msg': 'at least one filter is required',
+                'data': None,
+            }
+        )
+    submissions = await submission_db.mark_submissions_pending(filters)
+    if not submissions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                'code': status.HTTP_404_NOT_FOUND,
+                'msg': 'no submission matches the filters',
+                'data': None,
+            }
+        )
+    redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
+    rejudge_id = await judge_tool.start_bulk_rejudge(redis, submissions)
+    return {
+        'code': status.HTTP_200_OK,
+        'msg': 'rejudge started',
+        'data': {'rejudge_id': rejudge_id, 'total': len(submissions)},
+    }
+
+@router.get('/rejudges/{rejudge_id}')
+async def get_bulk_rejudge(
+    rejudge_id: str,
+    current_user: User = Depends(auth.get_current_user_admin_only),
+):
+
+    """get the progress of a bulk rejudge"""
+
+    redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
+    progress = await judge_tool.bulk_rejudge_progress(redis, rejudge_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                'code': status.HTTP_404_NOT_FOUND,
+                'msg': 'the bulk rejudge does not exist',
+                'data': None,
+            }
+        )
+    return {
+        'code': status.HTTP_200_OK,
+        'msg': 'success',
+        'data': progress,
+    }
+
+@router.put('/rejudges/{rejudge_id}/resume')
+async def resume_bulk_rejudge(
+    rejudge_id: str,
+    current_user: User = Depends(auth.get_current_user_admin_only),
+):
+
+    """resume a bulk rejudge stopped before all its submissions were enqueued"""
+
+    redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
+    if not await judge_tool.resume_bulk_rejudge(redis, rejudge_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                'code': status.HTTP_409_CONFLICT,
+                'msg': 'the bulk rejudge is not stopped',
+                'data': None,
+            }
+        )
+    return {
+        'code': status.HTTP_200_OK,
+        'msg': 'rejudge resumed',
+        'data': {'rejudge_id': rejudge_id},
+    }
@@ -21,8 +21,8 @@ async def add_new_language(
     # get the redis client
     redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
     if await language_db.create_language_in_db(language, redis):
-        # adding success, pull the image if it does not exist
-        if not await shared_tool.image_exists(language.image_name):
+        # adding success, pull the image if it does not exist (the local backend needs none)
+        if language.backend == 'docker' and not await shared_tool.image_exists(language.image_name):
             await redis.set(f'download:image:{language.image_name}', 0)
             await redis.enqueue_job('pull_image', language.image_name)
         return {
@@ -5,7 +5,7 @@ from api.core.security import auth
 from api.utils import problem_tool
 from shared.models import User, UserRole
 from shared.schemas import ProblemSchema
-from shared.utils import oj_cache
+from shared.utils import oj_cache, problem_parse
 from shared.db import problem_db
 
 router = APIRouter(prefix='/problems')
@@ -91,10 +91,11 @@ async def get_problem(
             'data': problem_tool.dump_testcases(problem),
         }
     else:
+        testcases = await problem_db.get_testcases(problem)
         return {
             'code': status.HTTP_200_OK,
             'msg': 'success',
-            'data': problem,
+            'data': problem_parse.problem_to_problem_schema(problem, testcases),
         }
     
 @router.delete('/{problem_id}')
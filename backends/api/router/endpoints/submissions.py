@@ -6,7 +6,7 @@ from fastapi_cache import FastAPICache
 from fastapi_cache.decorator import cache
 from arq import ArqRedis
 from api.core.security import auth
-from api.utils import submission_tool
+from api.utils import submission_tool, judge_tool
 from shared.models import User, SubmissionStatus, UserRole
 from shared.schemas import SubmissionPostModel
 from shared.db import problem_db, language_db, submission_db, user_db
@@ -80,7 +80,7 @@ async def submit_code(
         )
     await submission_tool.record_submission(redis, current_user.id, submission_time)
     await user_db.add_submit_count(current_user)
-    await redis.enqueue_job('judge_task', submission_id)
+    await judge_tool.enqueue_judge(redis, submission_id, judge_tool.JudgeLane.LIVE, current_user.id, 0) # type: ignore
     return {
         'code': status.HTTP_200_OK,
         'msg': 'success',
@@ -191,9 +191,11 @@ async def rejudge_code(submission_id: str, current_user: User = Depends(auth.get
                 'data': None,
             }
         )
-    await submission_db.update_submission_in_db(submission, SubmissionStatus.PENDING)
+    generation = await submission_db.start_rejudge_in_db(submission)
     redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
-    await redis.enqueue_job('judge_task', submission_id)
+    await judge_tool.enqueue_judge(
+        redis, submission_id, judge_tool.JudgeLane.REJUDGE, submission.user_id, generation, # type: ignore
+    )
     return {
         'code': status.HTTP_200_OK,
         'msg': 'rejudge started',
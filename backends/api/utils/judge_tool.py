@@ -0,0 +1,222 @@
+from datetime import datetime, timezone
+from enum import Enum
+import asyncio
+import logging
+import time
+import uuid
+from arq import ArqRedis
+from arq.constants import default_queue_name
+from shared.db import submission_db
+from api.core.config import settings
+
+logger = logging.getLogger('debug')
+
+# the progress of a bulk rejudge, and its submissions as "submission_id:user_id:generation"
+BULK_REJUDGE_KEY = 'bulk_rejudge:{}'
+BULK_REJUDGE_SUBMISSIONS_KEY = 'bulk_rejudge:{}:submissions'
+BULK_REJUDGE_EXPIRE = 7 * 24 * 3600
+BULK_REJUDGE_STALL = 60  # seconds without progress before a running fan-out is taken as dead
+
+# the fan-outs running in this process, kept so they are not collected
+bulk_rejudge_tasks: set[asyncio.Task] = set()
+
+# take the next rank of the user in the lane: the later of the rank given and
+# the rank the previous job of the user left, the latter then moves on by the
+# quantum and is kept until it falls behind the ranks given
+NEXT_RANK_SCRIPT = """
+local rank = tonumber(ARGV[1])
+local previous = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if previous > rank then
+    rank = previous
+end
+local quantum = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], tostring(rank + quantum), 'PX', math.max(1, math.ceil(rank + quantum - ARGV[1])) * 1000)
+return tostring(rank)
+"""
+
+class JudgeLane(str, Enum):
+
+    """the priority lanes of the judge jobs"""
+
+    LIVE = 'live'           # the submissions of the users
+    REJUDGE = 'rejudge'     # the rejudges of single submissions
+    BULK = 'bulk'           # the rejudges of many submissions at once
+
+def lane_headstart(lane: JudgeLane) -> int:
+
+    """the seconds a job of the lane is ranked ahead of its enqueue time"""
+
+    if lane == JudgeLane.LIVE:
+        return settings.live_headstart
+    if lane == JudgeLane.REJUDGE:
+        return settings.rejudge_headstart
+    return 0
+
+async def next_rank(redis: ArqRedis, lane: JudgeLane, user_id: int) -> float:
+
+    """the rank (a timestamp) of the next job of the user in the lane
+
+    The jobs of a burst are ranked one quantum apart, so the job of another
+    user enqueued meanwhile is ranked behind at most one of them. A rank
+    is never later than now, which would defer the job even if the
+    workers are idle, so the rest of a long burst is ranked at now, still
+    behind the jobs of the lane enqueued later by the other users.
+    """
+
+    now = datetime.now(timezone.utc).timestamp()
+    rank = float(await redis.eval( # type: ignore
+        NEXT_RANK_SCRIPT,
+        1,
+        f'judge_rank:{lane.value}:{user_id}',
+        now - lane_headstart(lane),
+        settings.fair_share_quantum,
+    ))
+    return min(rank, now)
+
+async def enqueue_judge(
+    redis: ArqRedis,
+    submission_id: str,
+    lane: JudgeLane,
+    user_id: int,
+    generation: int,
+):
+
+    """enqueue the judge of the generation of the submission of the user in the lane
+
+    All lanes share the arq queue, which is drained in the order of the
+    scores, so a lane is a head start on the score of its jobs, and the
+    jobs of each user are spread out within the lane. The job id starts
+    with the lane, so that the queue can be counted by lane, and ends
+    with the submission and the generation, so that arq drops the
+    duplicate enqueues of a judge.
+    """
+
+    # a score in the past makes the job ready at once but ranks it earlier
+    rank = await next_rank(redis, lane, user_id)
+    job = await redis.enqueue_job(
+        'judge_task',
+        submission_id,
+        generation,
+        _job_id=f'{lane.value}:{submission_id}:{generation}',
+        _defer_until=datetime.fromtimestamp(rank, timezone.utc),
+    )
+    if job is None:
+        logger.debug(f'submission {submission_id} (generation {generation}) is already enqueued')
+    else:
+        logger.debug(f'submission {submission_id} (generation {generation}) enqueued in the {lane.value} lane')
+
+async def lane_depths(redis: ArqRedis) -> dict[str, int]:
+
+    """count the jobs waiting in the queue by lane"""
+
+    depths = {lane.value: 0 for lane in JudgeLane}
+    depths['other'] = 0
+    async for job_id, _ in redis.zscan_iter(default_queue_name):
+        lane = job_id.decode().split(':', 1)[0]
+        depths[lane if lane in depths else 'other'] += 1
+    return depths
+
+async def start_bulk_rejudge(redis: ArqRedis, submissions: list[tuple[str, int, int]]) -> str:
+
+    """record a bulk rejudge of the submissions and start enqueueing them"""
+
+    rejudge_id = uuid.uuid4().hex
+    key = BULK_REJUDGE_KEY.format(rejudge_id)
+    submissions_key = BULK_REJUDGE_SUBMISSIONS_KEY.format(rejudge_id)
+    pipe = redis.pipeline()
+    pipe.hset(key, mapping={
+        'state': 'running',
+        'total': len(submissions),
+        'enqueued': 0,
+        'updated': time.time(),
+        'created': datetime.now(timezone.utc).isoformat(),
+    })
+    pipe.rpush(submissions_key, *[':'.join(map(str, submission)) for submission in submissions])
+    pipe.expire(key, BULK_REJUDGE_EXPIRE)
+    pipe.expire(submissions_key, BULK_REJUDGE_EXPIRE)
+    await pipe.execute()
+    run_bulk_rejudge(redis, rejudge_id)
+    return rejudge_id
+
+def run_bulk_rejudge(redis: ArqRedis, rejudge_id: str):
+
+    """run the fan-out of the bulk rejudge in the background"""
+
+    task = asyncio.create_task(fan_out_bulk_rejudge(redis, rejudge_id))
+    bulk_rejudge_tasks.add(task)
+    task.add_done_callback(bulk_rejudge_tasks.discard)
+
+async def resume_bulk_rejudge(redis: ArqRedis, rejudge_id: str) -> bool:
+
+    """resume a stopped bulk rejudge from the last enqueued submission
+
+    A bulk rejudge is stopped if it was interrupted or failed, or if it is
+    still running but has not made progress for a while, since the api
+    process running it has died. This function returns false if the bulk
+    rejudge does not exist or is not stopped.
+    """
+
+    key = BULK_REJUDGE_KEY.format(rejudge_id)
+    state, updated = await redis.hmget(key, ['state', 'updated']) # type: ignore
+    stalled = state == b'running' and time.time() - float(updated or 0) > BULK_REJUDGE_STALL
+    if state not in (b'interrupted', b'failed') and not stalled:
+        return False
+    await redis.hset(key, 'state', 'running') # type: ignore
+    run_bulk_rejudge(redis, rejudge_id)
+    return True
+
+async def stop_bulk_rejudges():
+
+    """stop the fan-outs of this process, marking them as interrupted"""
+
+    for task in list(bulk_rejudge_tasks):
+        task.cancel()
+    await asyncio.gather(*bulk_rejudge_tasks, return_exceptions=True)
+
+async def fan_out_bulk_rejudge(redis: ArqRedis, rejudge_id: str):
+
+    """enqueue the submissions of the bulk rejudge in the bulk lane at the configured rate"""
+
+    key = BULK_REJUDGE_KEY.format(rejudge_id)
+    submissions_key = BULK_REJUDGE_SUBMISSIONS_KEY.format(rejudge_id)
+    rate = max(settings.bulk_rejudge_rate, 1)
+    try:
+        offset = int(await redis.hget(key, 'enqueued') or 0) # type: ignore
+        while True:
+            batch = await redis.lrange(submissions_key, offset, offset + rate - 1) # type: ignore
+            for entry in batch:
+                submission_id, user_id, generation = entry.decode().split(':')
+                await enqueue_judge(redis, submission_id, JudgeLane.BULK, int(user_id), int(generation))
+            offset += len(batch)
+            await redis.hset(key, mapping={'enqueued': offset, 'updated': time.time()}) # type: ignore
+            if len(batch) < rate:
+                break
+            await asyncio.sleep(1)
+        await redis.hset(key, 'state', 'enqueued') # type: ignore
+        logger.debug(f'bulk rejudge {rejudge_id} enqueued {offset} submissions')
+    except asyncio.CancelledError:
+        await redis.hset(key, 'state', 'interrupted') # type: ignore
+        raise
+    except Exception as e:
+        logger.error(f'bulk rejudge {rejudge_id} failed: {e}')
+        await redis.hset(key, 'state', 'failed') # type: ignore
+
+async def bulk_rejudge_progress(redis: ArqRedis, rejudge_id: str) -> dict | None:
+
+    """get the progress of the bulk rejudge, or None if it does not exist"""
+
+    info = await redis.hgetall(BULK_REJUDGE_KEY.format(rejudge_id)) # type: ignore
+    if not info:
+        return None
+    entries = await redis.lrange(BULK_REJUDGE_SUBMISSIONS_KEY.format(rejudge_id), 0, -1) # type: ignore
+    submission_ids = [entry.decode().split(':', 1)[0] for entry in entries]
+    pending = await submission_db.count_pending_submissions(submission_ids) if submission_ids else 0
+    total = int(info[b'total'])
+    return {
+        'rejudge_id': rejudge_id,
+        'state': info[b'state'].decode(),
+        'created': info[b'created'].decode(),
+        'total': total,
+        'enqueued': int(info[b'enqueued']),
+        'judged': total - pending,
+    }
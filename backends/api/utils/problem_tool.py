@@ -54,9 +54,11 @@ async def problem_list_paginated(
 
 def dump_testcases(problem: Problem) -> dict:
 
-    """this function dumps the testcases in a problem away"""
+    """this function dumps the testcases and the checker in a problem away"""
 
-    problem_info = problem_parse.problem_to_problem_schema(problem)
-    problem_dict: dict = problem_info.model_dump()
-    del problem_dict['testcases']
-    return problem_dict
+    # the testcases are stored apart, so they are never loaded here
+    problem_info = problem_parse.problem_to_problem_info(problem)
+    # a checker often embeds the expected answers
+    problem_info.pop('checker_code')
+    problem_info.pop('checker_language')
+    return problem_info
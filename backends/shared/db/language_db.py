@@ -1,51 +1,63 @@
-import asyncio
 import json
 from redis.asyncio import Redis as AioRedis
 from tortoise.exceptions import IntegrityError
 from ..models import Language
 from ..schemas import LanguageSchema
-from ..utils import language_parse
+from ..utils import language_parse, oj_cache
+
+# all languages are stored in a single redis hash (name -> json), so that
+# they can be read in one round trip
+LANGUAGE_HASH = 'languages'
+# the key pattern of the languages stored before the hash
+LEGACY_LANGUAGE_PATTERN = 'language:*'
+
+# the languages parsed by this process, dropped when a change is published
+language_cache: dict[str, LanguageSchema] = {}
+
+def drop_cached_language(lan_name: str | None = None):
+
+    """drop a language (or all languages if no name is given) from the cache of this process"""
+
+    if lan_name is None:
+        language_cache.clear()
+    else:
+        language_cache.pop(lan_name, None)
+
+async def listen_language_changes(redis: AioRedis):
+
+    """keep the language cache of this process coherent with the other processes"""
+
+    await oj_cache.listen_changes(redis, oj_cache.LANGUAGE_CHANNEL, drop_cached_language) # type: ignore
 
 async def get_language(lan_name: str, redis: AioRedis) -> LanguageSchema | None:
 
     """returns the corresponding language schema"""
 
-    if not lan_name.startswith('language:'):
-        # for normal usage (in api/worker)
-        key_name = f'language:{lan_name}'
-    else:
-        # for the get_all_languages
-        key_name = lan_name
-    lan_content = await redis.get(key_name)
+    language = language_cache.get(lan_name)
+    if language is not None:
+        return language
+    lan_content = await redis.hget(LANGUAGE_HASH, lan_name) # type: ignore
     if lan_content is None:
         return None
     lan_dict = json.loads(lan_content)
     language = LanguageSchema(**lan_dict)
+    language_cache[lan_name] = language
     return language
 
 async def get_all_languages(redis: AioRedis) -> list[LanguageSchema]:
 
     """returns all language dict in a list"""
 
-    key_pattern = 'language:*'
-    cursor = 0
-    lan_keys: list[bytes] = []
-
-    # find the keys
-    while True:
-        cursor, keys = await redis.scan(
-            cursor=cursor,
-            match=key_pattern,
-            count=100,
-        )
-        lan_keys.extend(keys)
-        if cursor == 0:
-            break
-
-    # get the languages
-    get_tasks = [get_language(lan.decode(), redis) for lan in lan_keys]
-    lan_sche = await asyncio.gather(*get_tasks)
-    return lan_sche # type: ignore since there must be value saved for existed keys
+    lan_contents: dict[bytes, bytes] = await redis.hgetall(LANGUAGE_HASH) # type: ignore
+    languages = []
+    for name, lan_content in lan_contents.items():
+        lan_name = name.decode()
+        language = language_cache.get(lan_name)
+        if language is None:
+            language = LanguageSchema(**json.loads(lan_content))
+            language_cache[lan_name] = language
+        languages.append(language)
+    return languages
 
 async def create_language_in_db(lan: LanguageSchema, redis: AioRedis) -> bool:
 
@@ -62,34 +74,53 @@ async def create_language_in_db(lan: LanguageSchema, redis: AioRedis) -> bool:
         return False
     
     # add the language to the redis
-    await redis.set(f'language:{lan.name}', lan.model_dump_json())
+    await redis.hset(LANGUAGE_HASH, lan.name, lan.model_dump_json()) # type: ignore
+    drop_cached_language(lan.name)
+    await oj_cache.publish_language_change(redis, lan.name) # type: ignore
     return True
 
 async def init_lan_in_redis(redis: AioRedis):
 
-    """put all languages in the database into redis"""
+    """put all languages in the database into redis
+
+    The database is the source of the languages, so the keys stored
+    before the hash are just dropped once the hash is rebuilt.
+    """
 
     languages = await Language.all()
     lans = [language_parse.language_to_language_schema(language) for language in languages]
-    init_tasks = [redis.set(f'language:{lan.name}', lan.model_dump_json()) for lan in lans]
-    await asyncio.gather(*init_tasks)
+    if lans:
+        await redis.hset(LANGUAGE_HASH, mapping={lan.name: lan.model_dump_json() for lan in lans}) # type: ignore
+    await delete_legacy_languages(redis)
+    drop_cached_language()
+    await oj_cache.publish_language_change(redis) # type: ignore
 
-async def reset_language_table(redis: AioRedis):
+async def delete_legacy_languages(redis: AioRedis):
 
-    """reset the language table and the redis"""
+    """delete the languages stored as one key per language before the hash"""
 
-    await Language.all().delete()
     cursor = 0
     while True:
         cursor, keys = await redis.scan(
             cursor=cursor,
-            match='language:*',
+            match=LEGACY_LANGUAGE_PATTERN,
             count=100,
         )
-        await redis.delete(*keys)
+        if keys:
+            await redis.delete(*keys)
         if cursor == 0:
             break
 
+async def reset_language_table(redis: AioRedis):
+
+    """reset the language table and the redis"""
+
+    await Language.all().delete()
+    await redis.delete(LANGUAGE_HASH)
+    await delete_legacy_languages(redis)
+    drop_cached_language()
+    await oj_cache.publish_language_change(redis) # type: ignore
+
 async def export_language_table():
 
     """export all languages in the table"""
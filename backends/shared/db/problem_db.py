@@ -1,7 +1,9 @@
+import uuid
 from tortoise.exceptions import IntegrityError
-from ..models import Problem
-from ..schemas import ProblemSchema
-from ..utils import problem_parse, oj_cache
+from tortoise.transactions import in_transaction
+from ..models import Problem, ProblemTestcase
+from ..schemas import ProblemSchema, ProbCase
+from ..utils import problem_parse, oj_cache, output_digest
 
 async def get_problem_by_id(id: str):
 
@@ -18,8 +20,16 @@ async def create_problem_in_db(prob: ProblemSchema) -> bool:
     """
 
     problem_to_create = problem_parse.problem_schema_to_problem(prob)
+    problem_to_create.output_digests = output_digest.testcase_digests(
+        problem_to_create.testcases,
+        problem_to_create.compare_mode,
+    )
+    testcase_rows = problem_parse.split_testcases(problem_to_create)
+    problem_to_create.version = uuid.uuid4().hex
     try:
-        await problem_to_create.save()
+        async with in_transaction():
+            await problem_to_create.save()
+            await ProblemTestcase.bulk_create(testcase_rows)
     except IntegrityError:
         return False
 
@@ -28,6 +38,7 @@ async def create_problem_in_db(prob: ProblemSchema) -> bool:
     next_problem = await Problem.filter(id__gt=prob.id).order_by('id').first()
 
     await oj_cache.delete_cache(item_type='problem', problem_id=None)
+    await oj_cache.publish_problem_change(prob.id)
     if prev_problem is not None:
         await oj_cache.delete_cache(item_type='problem', problem_id=prev_problem.id)
     if next_problem is not None:
@@ -40,12 +51,14 @@ async def delete_problem_in_db(problem: Problem):
 
     await oj_cache.delete_cache(item_type='problem', problem_id=problem.id)
     await problem.delete()
+    await oj_cache.publish_problem_change(problem.id)
 
 async def reset_problem_table():
 
     """reset the problem table"""
 
     await Problem.all().delete()
+    await oj_cache.publish_problem_change()
 
 async def export_problem_table():
 
@@ -57,4 +70,48 @@ async def import_problem_in_db(problems: list[Problem]):
 
     """import all problem in the list"""
 
+    existing_ids = set(await Problem.filter(id__in=[p.id for p in problems]).values_list('id', flat=True))
+    testcase_rows = []
+    for problem in problems:
+        problem.output_digests = output_digest.testcase_digests(problem.testcases, problem.compare_mode)
+        if problem.id not in existing_ids:
+            testcase_rows.extend(problem_parse.split_testcases(problem))
+            problem.version = uuid.uuid4().hex
     await Problem.bulk_create(problems, ignore_conflicts=True)
+    await ProblemTestcase.bulk_create(testcase_rows, ignore_conflicts=True)
+    for problem in problems:
+        if problem.id not in existing_ids:
+            await oj_cache.publish_problem_change(problem.id)
+
+def testcase_count(problem: Problem) -> int:
+
+    """the number of testcases of the problem"""
+
+    return len(problem.testcases)
+
+async def get_problem_version(problem_id: str) -> tuple[bool, str | None]:
+
+    """check if the problem exists and get its version without loading it"""
+
+    versions = await Problem.filter(id=problem_id).values_list('version', flat=True)
+    if not versions:
+        return False, None
+    return True, versions[0]
+
+async def get_testcase(problem: Problem, index: int) -> ProbCase:
+
+    """get one testcase of the problem"""
+
+    if not problem_parse.has_manifest(problem):
+        return problem_parse.inline_testcases(problem)[index]
+    row = await ProblemTestcase.get(problem_id=problem.id, index=index)
+    return ProbCase(input=row.input, output=row.output)
+
+async def get_testcases(problem: Problem) -> list[ProbCase]:
+
+    """get all testcases of the problem, which are only loaded when needed"""
+
+    if not problem_parse.has_manifest(problem):
+        return problem_parse.inline_testcases(problem)
+    rows = await ProblemTestcase.filter(problem_id=problem.id).order_by('index')
+    return [ProbCase(input=row.input, output=row.output) for row in rows]
@@ -2,8 +2,10 @@ from itertools import chain
 import logging
 from datetime import datetime
 from tortoise.exceptions import IntegrityError, OperationalError
+from tortoise.transactions import in_transaction
+from tortoise.expressions import F
 from ..models import Submission, SubmissionStatus, Test
-from ..schemas import SubmissionPostModel, SubmissionData, SubmissionTestDetail
+from ..schemas import SubmissionPostModel, SubmissionData, SubmissionTestDetail, BulkRejudgeModel
 from ..utils import submission_parse, oj_cache
 
 logger = logging.getLogger('debug')
@@ -71,7 +73,7 @@ async def get_submission_log_in_db(submission_id: str):
         submission = await Submission.get_or_none(id=submission_id)
         if submission is None:
             return None, None
-        tests = await submission.tests.order_by('test_id').all().values('test_id', 'result', 'time', 'memory') # pyright: ignore[reportArgumentType]
+        tests = await submission.tests.order_by('test_id').all().values('test_id', 'result', 'time', 'wall_time', 'memory') # pyright: ignore[reportArgumentType]
         return submission, tests
     except OperationalError:
         return None, None
@@ -82,32 +84,124 @@ async def update_submission_in_db(
     score: int | None = None,
     counts: int | None = None,
     tests: list[SubmissionTestDetail] | None = None,
-):
+    generation: int | None = None,
+) -> bool:
     
     """update the submission in the database
     
     This function updates the submission in the database. For the tests,
     if the tests parameter is not None, the function will remove the old
-    tests first, and then create the new tests.
+    tests first, and then create the new tests. With a generation, the
+    submission is only updated if it has not been rejudged since, and
+    this function returns false if it has.
+    """
+
+    async with in_transaction():
+        if generation is not None:
+            updated = await Submission.filter(id=submission.id, judge_generation=generation).update(
+                status=status,
+                score=score,
+                counts=counts,
+            )
+            if not updated:
+                return False
+        submission.status = status
+        submission.score = score # type: ignore
+        submission.counts = counts # type: ignore
+        await submission.tests.all().delete() # type: ignore
+        if generation is None:
+            # the generation is left alone, a rejudge may have bumped it
+            await submission.save(update_fields=['status', 'score', 'counts'])
+        if tests is not None:
+            tests_to_add = [Test(
+                test_id=test.test_id,
+                submission_id=submission.id,
+                result=test.result,
+                time=test.time,
+                wall_time=test.wall_time,
+                memory=test.memory,
+            ) for test in tests]
+            await Test.bulk_create(tests_to_add)
+
+    # delete the cache
+    await oj_cache.delete_cache(item_type='submission', submission_id=str(submission.id))
+    return True
+
+async def fail_pending_submission(submission_id: str, generation: int | None = None):
+
+    """mark the submission as an error if it is still pending for the generation"""
+
+    query = Submission.filter(id=submission_id, status=SubmissionStatus.PENDING)
+    if generation is not None:
+        query = query.filter(judge_generation=generation)
+    await query.update(status=SubmissionStatus.ERROR)
+    await oj_cache.delete_cache(item_type='submission', submission_id=submission_id)
+
+async def start_rejudge_in_db(submission: Submission) -> int:
+
+    """mark the submission as pending for a new judge and return its judge generation
+
+    The generation is bumped in the database, so a judge of an earlier
+    generation still running discards its results.
     """
 
-    submission.status = status
-    submission.score = score # type: ignore
-    submission.counts = counts # type: ignore
-    await submission.tests.all().delete() # type: ignore
-    await submission.save()
-    if tests is not None:
-        tests_to_add = [Test(
-            test_id=test.test_id,
-            submission_id=submission.id,
-            result=test.result,
-            time=test.time,
-            memory=test.memory,
-        ) for test in tests]
-        await Test.bulk_create(tests_to_add)
+    async with in_transaction():
+        await Submission.filter(id=submission.id).update(
+            status=SubmissionStatus.PENDING,
+            score=None,
+            counts=None,
+            judge_generation=F('judge_generation') + 1,
+        )
+        await Test.filter(submission_id=submission.id).delete()
+        await submission.refresh_from_db(fields=['status', 'score', 'counts', 'judge_generation'])
 
     # delete the cache
     await oj_cache.delete_cache(item_type='submission', submission_id=str(submission.id))
+    return submission.judge_generation
+
+async def mark_submissions_pending(filters: BulkRejudgeModel) -> list[tuple[str, int, int]]:
+
+    """mark the submissions selected by the filters as pending
+
+    The submissions are updated (bumping their judge generations) and
+    their tests removed with one statement each, instead of a round trip
+    per submission. This function returns the ids of the submissions
+    with the ids of their users and their new generations.
+    """
+
+    query = Submission.all()
+    if filters.problem_id is not None:
+        query = query.filter(problem_id=filters.problem_id)
+    if filters.language is not None:
+        query = query.filter(language=filters.language)
+    if filters.status is not None:
+        query = query.filter(status=filters.status)
+    if filters.start_time is not None:
+        query = query.filter(submission_time__gte=filters.start_time)
+    if filters.end_time is not None:
+        query = query.filter(submission_time__lt=filters.end_time)
+
+    async with in_transaction():
+        ids = await query.order_by('submission_time').values_list('id', flat=True)
+        if not ids:
+            return []
+        await Submission.filter(id__in=ids).update(
+            status=SubmissionStatus.PENDING,
+            score=None,
+            counts=None,
+            judge_generation=F('judge_generation') + 1,
+        )
+        await Test.filter(submission_id__in=ids).delete()
+        selected = await Submission.filter(id__in=ids).order_by('submission_time').values_list(
+            'id', 'user_id', 'judge_generation',
+        )
+    return [(str(submission_id), user_id, generation) for submission_id, user_id, generation in selected] # type: ignore
+
+async def count_pending_submissions(submission_ids: list[str]) -> int:
+
+    """count the submissions among the ids that are still pending"""
+
+    return await Submission.filter(id__in=submission_ids, status=SubmissionStatus.PENDING).count()
 
 async def reset_submission_table():
 
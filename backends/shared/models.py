@@ -35,6 +35,28 @@ class Difficulty(str, Enum):
     MEDIUM = 'medium'
     HARD = 'hard'
 
+class JudgePolicy(str, Enum):
+
+    """how the testcases of a submission are judged"""
+
+    FULL = 'full'           # run every testcase
+    FAIL_FAST = 'fail_fast' # stop at the first testcase that is not AC
+
+class RunBackend(str, Enum):
+
+    """where the code of a language is compiled and run"""
+
+    DOCKER = 'docker'   # in the containers of the language image
+    LOCAL = 'local'     # directly on the worker, with its installed toolchain
+
+class CompareMode(str, Enum):
+
+    """how the output of a testcase is compared with the expected output"""
+
+    EXACT = 'exact'         # ignore the whitespace around the whole output
+    TOKEN = 'token'         # compare the whitespace-separated tokens
+    TRAILING = 'trailing'   # ignore the trailing whitespace of each line and the blank lines at the end
+
 class Problem(models.Model):
 
     """a model for a problem"""
@@ -46,6 +68,8 @@ class Problem(models.Model):
     output_description = fields.TextField(null=False)
     samples = fields.JSONField(null=False)
     constraints = fields.TextField(null=False)
+    # the manifest of the testcases stored in ProblemTestcase, or the
+    # testcases themselves for the problems stored before the manifest
     testcases = fields.JSONField(null=False)
 
     hint = fields.TextField(null=True)
@@ -53,11 +77,40 @@ class Problem(models.Model):
     tags = fields.JSONField(null=True)
     time_limit = fields.FloatField(null=True)
     memory_limit = fields.IntField(null=True)
+    output_limit = fields.IntField(null=True) # MB, the one of the language if not set
     author = fields.CharField(max_length=50, null=True)
     difficulty = fields.CharEnumField(Difficulty, default=Difficulty.MEDIUM)
+    judge_policy = fields.CharEnumField(JudgePolicy, null=True)
+    compare_mode = fields.CharEnumField(CompareMode, default=CompareMode.EXACT)
+    # the digests of the normalized expected outputs, computed on creation
+    output_digests = fields.JSONField(null=True)
+    # an optional checker deciding the verdict instead of comparing the outputs
+    checker_code = fields.TextField(null=True)
+    checker_language = fields.CharField(max_length=15, null=True)
+    # a new random version each time the problem is stored, which tells
+    # the caches of the workers apart from a deleted problem with the same id
+    version = fields.CharField(max_length=32, null=True)
 
     submissions = fields.ReverseRelation['Submission']
     resolves = fields.ReverseRelation['Resolve']
+    testcase_rows = fields.ReverseRelation['ProblemTestcase']
+
+class ProblemTestcase(models.Model):
+
+    """a model for a testcase of a problem, stored apart from the problem
+    so that reading a problem does not load its testcases"""
+
+    problem = fields.ForeignKeyField(
+        model_name='models.Problem',
+        related_name='testcase_rows',
+        on_delete=fields.OnDelete.CASCADE,
+    )
+    index = fields.IntField(null=False)
+    input = fields.TextField(null=False)
+    output = fields.TextField(null=False)
+
+    class Meta:
+        unique_together = (('problem', 'index'),)
 
 class SubmissionStatus(str, Enum):
 
@@ -88,6 +141,7 @@ class Submission(models.Model):
     score = fields.IntField(null=True)
     counts = fields.IntField(null=True)
     code = fields.TextField(null=False)
+    judge_generation = fields.IntField(default=0)   # bumped by each rejudge
     tests = fields.ReverseRelation['Test']
 
 class TestResult(str, Enum):
@@ -100,7 +154,9 @@ class TestResult(str, Enum):
     CE = 'CE'
     TLE = 'TLE'
     MLE = 'MLE'
+    OLE = 'OLE'     # the output exceeded the output limit
     UNK = 'UNK'
+    SKIP = 'SKIP'   # not run since an earlier testcase failed
 
 class Test(models.Model):
 
@@ -113,7 +169,8 @@ class Test(models.Model):
         on_delete=fields.OnDelete.CASCADE,
     )
     result = fields.CharEnumField(TestResult)
-    time = fields.FloatField(null=False)
+    time = fields.FloatField(null=False)        # cpu time
+    wall_time = fields.FloatField(null=True)
     memory = fields.IntField(null=False)
 
 class Resolve(models.Model):
@@ -143,4 +200,7 @@ class Language(models.Model):
     run_cmd = fields.CharField(max_length=20, null=False)
     time_limit = fields.FloatField(null=False)
     memory_limit = fields.IntField(null=False)
+    output_limit = fields.IntField(default=64) # MB
     image_name = fields.CharField(max_length=50, null=False)
+    backend = fields.CharEnumField(RunBackend, default=RunBackend.DOCKER)
+    judge_policy = fields.CharEnumField(JudgePolicy, default=JudgePolicy.FULL)
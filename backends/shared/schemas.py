@@ -29,8 +29,13 @@ class ProblemSchema(BaseModel):
     tags: list[str] = []
     time_limit: float | None = Field(default=None, ge=0)
     memory_limit: int | None = Field(default=None, ge=0)
+    output_limit: int | None = Field(default=None, ge=1)
     author: str = ""
     difficulty: str = 'medium'
+    judge_policy: Literal['full', 'fail_fast'] | None = None
+    compare_mode: Literal['exact', 'token', 'trailing'] = 'exact'
+    checker_code: str | None = None
+    checker_language: str | None = Field(default=None, max_length=15)
 
 class UserCredentials(BaseModel):
 
@@ -79,7 +84,10 @@ class LanguageSchema(BaseModel):
     run_cmd: str = Field(min_length=1)
     time_limit: float = Field(default=1.0, ge=0)
     memory_limit: int = Field(default=128, ge=0)
+    output_limit: int = Field(default=64, ge=1)
     image_name: str = Field(min_length=1)
+    judge_policy: Literal['full', 'fail_fast'] = 'full'
+    backend: Literal['docker', 'local'] = 'docker'
 
 class SubmissionPostModel(BaseModel):
 
@@ -89,6 +97,16 @@ class SubmissionPostModel(BaseModel):
     language: str = Field(min_length=1)
     code: str = Field(min_length=1)
 
+class BulkRejudgeModel(BaseModel):
+
+    """the filters selecting the submissions to rejudge at once"""
+
+    problem_id: str | None = Field(default=None, min_length=1)
+    language: str | None = Field(default=None, min_length=1)
+    status: Literal['success', 'pending', 'error'] | None = None
+    start_time: datetime | None = None
+    end_time: datetime | None = None
+
 class UserData(BaseModel):
 
     """the complete version of user (for importing data)"""
@@ -108,6 +126,7 @@ class SubmissionTestDetail(BaseModel):
     test_id: int
     result: str
     time: float
+    wall_time: float | None = None
     memory: int
 
 class SubmissionData(BaseModel):
@@ -19,5 +19,8 @@ def language_to_language_schema(language: Language) -> LanguageSchema:
         run_cmd=language.run_cmd,
         time_limit=language.time_limit,
         memory_limit=language.memory_limit,
+        output_limit=language.output_limit,
         image_name=language.image_name,
+        judge_policy=language.judge_policy,
+        backend=language.backend,
     )
@@ -11,6 +11,10 @@ from ..models import User
 
 logger = logging.getLogger('debug')
 
+# the channels telling the api and the workers to drop their local copies
+PROBLEM_CHANNEL = 'problem-changes'
+LANGUAGE_CHANNEL = 'language-changes'
+
 async def store_info_key_map(
     item_type: str,
     cache_key: str,
@@ -97,6 +101,53 @@ async def delete_cache(
     await asyncio.gather(*delete_tasks)
     logger.debug(f'cache deleted for {item_type} with {kwargs}')
 
+async def publish_problem_change(problem_id: str | None = None):
+
+    """tell the workers to drop a problem (or all problems if no id is given) from their caches"""
+
+    redis: ArqRedis = FastAPICache.get_backend().redis # type: ignore
+    await redis.publish(PROBLEM_CHANNEL, problem_id or '*')
+    logger.debug(f'problem change published for {problem_id or "all problems"}')
+
+async def publish_language_change(redis: ArqRedis, lan_name: str | None = None):
+
+    """tell every process to drop a language (or all languages if no name is given) from its cache"""
+
+    await redis.publish(LANGUAGE_CHANNEL, lan_name or '*')
+    logger.debug(f'language change published for {lan_name or "all languages"}')
+
+async def listen_changes(
+    redis: ArqRedis,
+    channel: str,
+    on_change: Callable[[Optional[str]], None],
+):
+
+    """call on_change with each changed item (None for all items) published on the channel
+
+    The changes published while not subscribed are lost, so on_change is
+    also called with None each time the channel is (re)subscribed.
+    """
+
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            on_change(None)
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                item = message['data']
+                if isinstance(item, bytes):
+                    item = item.decode()
+                on_change(None if item == '*' else item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f'subscription to {channel} lost: {e}')
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
 def user_list_key(
     current_user: User,
     page: int,
@@ -0,0 +1,60 @@
+from typing import Any, Iterator, NamedTuple
+import hashlib
+from ..models import CompareMode
+
+class OutputDigest(NamedTuple):
+
+    """the digest of a normalized expected output"""
+
+    sha256: str
+    length: int     # the number of characters of the normalized output
+
+def iter_normalized_lines(text: str) -> Iterator[str]:
+
+    """yield the lines of the text without their trailing whitespace"""
+
+    start = 0
+    while (end := text.find('\n', start)) != -1:
+        yield text[start:end].rstrip()
+        start = end + 1
+    yield text[start:].rstrip()
+
+def normalize_output(text: str, mode: CompareMode) -> str:
+
+    """normalize the output so that two outputs match iff their normalized forms are equal"""
+
+    if mode == CompareMode.TOKEN:
+        return ' '.join(text.split())
+    if mode == CompareMode.TRAILING:
+        return '\n'.join(iter_normalized_lines(text.rstrip()))
+    return text.strip()
+
+def output_digest(text: str, mode: CompareMode) -> OutputDigest:
+
+    """compute the digest of the normalized output"""
+
+    normalized = normalize_output(text, mode)
+    return OutputDigest(
+        sha256=hashlib.sha256(normalized.encode()).hexdigest(),
+        length=len(normalized),
+    )
+
+def testcase_digests(testcases: list[dict[str, Any]], mode: CompareMode) -> dict[str, Any]:
+
+    """compute the digests of the expected outputs of the testcases
+
+    The mode is stored with the digests, since they are only valid for it.
+    """
+
+    return {
+        'mode': CompareMode(mode).value,
+        'cases': [list(output_digest(case['output'], mode)) for case in testcases],
+    }
+
+def get_testcase_digests(output_digests: dict[str, Any] | None, mode: CompareMode) -> list[OutputDigest] | None:
+
+    """get the digests of the testcases if they were computed for the mode"""
+
+    if not output_digests or output_digests.get('mode') != CompareMode(mode).value:
+        return None
+    return [OutputDigest(*case) for case in output_digests['cases']]
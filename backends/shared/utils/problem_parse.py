@@ -1,4 +1,6 @@
-from ..models import Problem
+from typing import Any
+import hashlib
+from ..models import Problem, ProblemTestcase
 from ..schemas import ProblemSchema, ProbCase
 
 def problem_schema_to_problem(prob: ProblemSchema) -> Problem:
@@ -8,13 +10,12 @@ def problem_schema_to_problem(prob: ProblemSchema) -> Problem:
     prob_dict = prob.model_dump()
     return Problem(**prob_dict)
 
-def problem_to_problem_schema(problem: Problem) -> ProblemSchema:
+def problem_to_problem_info(problem: Problem) -> dict[str, Any]:
 
-    """parse the problem to problemschema"""
+    """parse the problem to a dict of everything but the testcases"""
 
     samples = [ProbCase(**case) for case in problem.samples]
-    testcases = [ProbCase(**case) for case in problem.testcases]
-    return ProblemSchema(
+    return dict(
         id=problem.id,
         title=problem.title,
         description=problem.description,
@@ -22,12 +23,72 @@ def problem_to_problem_schema(problem: Problem) -> ProblemSchema:
         output_description=problem.output_description,
         samples=samples,
         constraints=problem.constraints,
-        testcases=testcases,
         hint=problem.hint,
         source=problem.source,
         tags=problem.tags,
         time_limit=problem.time_limit,
         memory_limit=problem.memory_limit,
+        output_limit=problem.output_limit,
         author=problem.author,
         difficulty=problem.difficulty,
+        judge_policy=problem.judge_policy,
+        compare_mode=problem.compare_mode,
+        checker_code=problem.checker_code,
+        checker_language=problem.checker_language,
     )
+
+def problem_to_problem_schema(problem: Problem, testcases: list[ProbCase] | None = None) -> ProblemSchema:
+
+    """parse the problem to problemschema
+
+    The testcases have to be given if the problem only has their manifest.
+    """
+
+    if testcases is None:
+        testcases = inline_testcases(problem)
+    return ProblemSchema(**problem_to_problem_info(problem), testcases=testcases)
+
+def testcase_key(content: str) -> str:
+
+    """the key of a testcase input or output, the hash of its content"""
+
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def has_manifest(problem: Problem) -> bool:
+
+    """check if the testcases of the problem are stored apart from it"""
+
+    return bool(problem.testcases) and 'input_key' in problem.testcases[0]
+
+def inline_testcases(problem: Problem) -> list[ProbCase]:
+
+    """parse the testcases stored in the problem itself"""
+
+    if has_manifest(problem):
+        raise ValueError(f'the testcases of problem {problem.id} are not inline')
+    return [ProbCase(**case) for case in problem.testcases]
+
+def split_testcases(problem: Problem) -> list[ProblemTestcase]:
+
+    """replace the inline testcases of the problem by their manifest
+
+    This function returns the testcases to store apart from the problem.
+    """
+
+    manifest = []
+    rows = []
+    for index, case in enumerate(problem.testcases):
+        manifest.append({
+            'input_key': testcase_key(case['input']),
+            'input_size': len(case['input']),
+            'output_key': testcase_key(case['output']),
+            'output_size': len(case['output']),
+        })
+        rows.append(ProblemTestcase(
+            problem_id=problem.id,
+            index=index,
+            input=case['input'],
+            output=case['output'],
+        ))
+    problem.testcases = manifest
+    return rows
@@ -11,6 +11,7 @@ async def parse_submission_to_data(submission: Submission):
         test_id=test.test_id, 
         result=test.result,
         time=test.time,
+        wall_time=test.wall_time,
         memory=test.memory,
     ) for test in tests]
 
@@ -51,6 +52,7 @@ def parse_data_to_submission(submission_data: SubmissionData) -> tuple[Submissio
         submission_id=submission.id,
         result=test.result,
         time=test.time,
+        wall_time=test.wall_time,
         memory=test.memory,
     ) for test in submission_data.details]
 
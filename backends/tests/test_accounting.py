@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+from worker.utils import accounting
+
+class TestReadRunStats(unittest.IsolatedAsyncioTestCase):
+
+    """test reading the stats file written by the wrapper"""
+
+    def setUp(self) -> None:
+
+        """create the directory of the stats file"""
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.stats_path = os.path.join(self.tmp_dir.name, 'stats.txt')
+
+    def tearDown(self) -> None:
+
+        """remove the stats file"""
+
+        self.tmp_dir.cleanup()
+
+    def write_stats(self, content: str):
+
+        """write the stats file"""
+
+        with open(self.stats_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    async def test_a_complete(self):
+
+        """test a stats file with every value"""
+
+        self.write_stats(
+            'code=0 cpu_start=1000000 cpu_end=1250000 up_start=10.00 up_end=10.50 '
+            f'peak={64 * 1024 ** 2} file={16 * 1024 ** 2}\n'
+        )
+        stats = await accounting.read_run_stats(self.stats_path)
+        assert stats is not None
+        self.assertEqual(stats.return_code, 0)
+        self.assertAlmostEqual(stats.cpu_time, 0.25)
+        self.assertAlmostEqual(stats.wall_time, 0.5)
+        # the page cache of the output is not the memory of the program
+        self.assertEqual(stats.memory_peak, 48)
+
+    async def test_b_missing(self):
+
+        """test that a missing stats file gives no stats"""
+
+        self.assertIsNone(await accounting.read_run_stats(self.stats_path))
+
+    async def test_c_partial(self):
+
+        """test that a stats file cut before the uptime gives no stats"""
+
+        for content in ('', 'code=0 cpu_start=1000000', 'code= up_start=1.0 up_end=2.0', 'code=0 up_start=1.0 up_end='):
+            with self.subTest(content=content):
+                self.write_stats(content)
+                self.assertIsNone(await accounting.read_run_stats(self.stats_path))
+
+    async def test_d_without_cgroup(self):
+
+        """test the stats of a kernel without cpu.stat, memory.peak or memory.stat"""
+
+        self.write_stats('code=137 cpu_start= cpu_end= up_start=3.0 up_end=4.25 peak= file=\n')
+        stats = await accounting.read_run_stats(self.stats_path)
+        assert stats is not None
+        self.assertEqual(stats.return_code, 137)
+        self.assertIsNone(stats.cpu_time)
+        self.assertIsNone(stats.memory_peak)
+        self.assertAlmostEqual(stats.wall_time, 1.25)
+
+    async def test_e_without_file(self):
+
+        """test the stats written before the page cache was recorded"""
+
+        self.write_stats(f'code=0 cpu_start=0 cpu_end=0 up_start=0 up_end=1 peak={10 * 1024 ** 2}\n')
+        stats = await accounting.read_run_stats(self.stats_path)
+        assert stats is not None
+        self.assertEqual(stats.memory_peak, 10)
+
+    def test_f_memory_without_files(self):
+
+        """test that the page cache never makes the memory negative"""
+
+        self.assertEqual(accounting.memory_without_files(8 * 1024 ** 2, 2 * 1024 ** 2), 6)
+        self.assertEqual(accounting.memory_without_files(1024 ** 2, 4 * 1024 ** 2), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from shared.models import CompareMode
+from shared.utils.output_digest import normalize_output, output_digest
+from worker.utils import comparator
+
+# pairs of an output and an expected output, covering the whitespace around
+# the chunk boundaries once they are read in chunks of a few characters
+CASES = [
+    ('1 2\n3\n', '1 2\n3'),
+    ('1 2\n3', '1 2\n3\n\n'),
+    ('  1 2\n3  \n\n', '1 2\n3'),
+    ('1 2 \n3\n', '1 2\n3'),
+    ('1  2\n3\n', '1 2\n3'),
+    ('1 2\n\n3\n', '1 2\n3'),
+    ('1 2\n\n\n3\n', '1 2\n\n3'),
+    ('abc def\n', 'abc de'),
+    ('abc de\n', 'abc def'),
+    ('abc\n   \n', 'abc'),
+    ('abc\n \t\nx', 'abc\n\nx'),
+    ('hello world', 'hello world'),
+    ('helloworld', 'hello world'),
+    ('hello   world\n\n\n', 'hello world'),
+    ('', ''),
+    ('\n\n', ''),
+    ('', 'x'),
+    ('x', ''),
+    # the outputs written on windows, and the expected outputs stored with \r\n
+    ('1 2\r\n3\r\n', '1 2\r\n3\r\n'),
+    ('1 2\r\n3\r\n', '1 2\n3\n'),
+    ('1 2\n3\n', '1 2\r\n3\r\n'),
+    ('1 2\r\n\r\n3', '1 2\r\n\r\n3\r\n'),
+    ('a\rb\n', 'a\rb'),
+    ('a\rb\n', 'a\nb'),
+]
+
+class TestComparator(unittest.IsolatedAsyncioTestCase):
+
+    """test the streamed comparison against the normalized outputs"""
+
+    def setUp(self) -> None:
+
+        """create the directory of the output files"""
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+
+        """remove the output files"""
+
+        self.tmp_dir.cleanup()
+
+    def write_output(self, output: str) -> str:
+
+        """write the output as it is, without translating the newlines"""
+
+        path = os.path.join(self.tmp_dir.name, 'out.txt')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(output)
+        return path
+
+    async def test_a_chunk_boundaries(self):
+
+        """test that every chunk size agrees with comparing the normalized outputs"""
+
+        for mode in CompareMode:
+            for output, expected in CASES:
+                path = self.write_output(output)
+                matched = normalize_output(output, mode) == normalize_output(expected, mode)
+                for chunk_size in range(1, 6):
+                    with self.subTest(mode=mode, output=output, expected=expected, chunk_size=chunk_size), \
+                    mock.patch.object(comparator, 'CHUNK_SIZE', chunk_size):
+                        self.assertEqual(await comparator.compare_output(path, expected, mode), matched)
+
+    async def test_b_digests(self):
+
+        """test that the digests of the expected outputs give the same verdicts"""
+
+        for mode in CompareMode:
+            for output, expected in CASES:
+                path = self.write_output(output)
+                matched = normalize_output(output, mode) == normalize_output(expected, mode)
+                digest = output_digest(expected, mode)
+                for chunk_size in range(1, 6):
+                    with self.subTest(mode=mode, output=output, expected=expected, chunk_size=chunk_size), \
+                    mock.patch.object(comparator, 'CHUNK_SIZE', chunk_size):
+                        self.assertEqual(await comparator.compare_output(path, digest, mode), matched)
+
+    async def test_c_long_output(self):
+
+        """test that an output longer than the expected one fails without reading it all"""
+
+        path = self.write_output('1\n' * 10000)
+        for mode in CompareMode:
+            with self.subTest(mode=mode), mock.patch.object(comparator, 'CHUNK_SIZE', 3):
+                self.assertFalse(await comparator.compare_output(path, '1\n1\n', mode))
+                self.assertFalse(await comparator.compare_output(path, output_digest('1\n1\n', mode), mode))
+
+if __name__ == "__main__":
+    unittest.main()
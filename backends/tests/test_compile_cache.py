@@ -0,0 +1,124 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from worker.utils.compile_cache import CompileCache
+
+class TestCompileCache(unittest.IsolatedAsyncioTestCase):
+
+    """test the hits, the misses and the eviction of the compile cache"""
+
+    def setUp(self) -> None:
+
+        """create the directories of the cache and of the submissions"""
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        self.redis = mock.AsyncMock()
+
+    def tearDown(self) -> None:
+
+        """remove the directories"""
+
+        self.tmp_dir.cleanup()
+
+    def make_submission(self, files: dict[str, str]) -> str:
+
+        """write the files of a submission into a directory of its own"""
+
+        path = tempfile.mkdtemp(dir=self.tmp_dir.name)
+        for name, content in files.items():
+            with open(os.path.join(path, name), 'w') as f:
+                f.write(content)
+        return path
+
+    async def test_a_key(self):
+
+        """test that the key changes with the code, the compile command and the image"""
+
+        docker = mock.MagicMock()
+        docker.images.inspect = mock.AsyncMock(return_value={'Id': 'sha256:1'})
+        cache = CompileCache(self.cache_dir, 1024)
+        key = await cache.key(docker, 'code', 'gcc {src}', 'gcc')
+        self.assertEqual(key, await cache.key(docker, 'code', 'gcc {src}', 'gcc'))
+        self.assertNotEqual(key, await cache.key(docker, 'code2', 'gcc {src}', 'gcc'))
+        self.assertNotEqual(key, await cache.key(docker, 'code', 'gcc -O2 {src}', 'gcc'))
+        docker.images.inspect = mock.AsyncMock(return_value={'Id': 'sha256:2'})
+        self.assertNotEqual(key, await cache.key(docker, 'code', 'gcc {src}', 'gcc'))
+
+    async def test_b_miss_then_hit(self):
+
+        """test that the stored files are restored into the next submission"""
+
+        cache = CompileCache(self.cache_dir, 1024)
+        dst = self.make_submission({'code.c': 'int main;'})
+        self.assertFalse(await cache.restore('k', dst, self.redis))
+        self.redis.incr.assert_awaited_with('compile_cache:misses')
+
+        src = self.make_submission({'code.c': 'int main;', 'code': 'binary'})
+        cache.store('k', src, ['code'])
+        self.assertTrue(await cache.restore('k', dst, self.redis))
+        self.redis.incr.assert_awaited_with('compile_cache:hits')
+        with open(os.path.join(dst, 'code')) as f:
+            self.assertEqual(f.read(), 'binary')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    async def test_c_eviction(self):
+
+        """test that the least recently used entries are evicted once the cache is full"""
+
+        cache = CompileCache(self.cache_dir, 10)
+        src = self.make_submission({'a': '1234', 'b': '5678', 'c': '9012'})
+        cache.store('a', src, ['a'])
+        cache.store('b', src, ['b'])
+        dst = self.make_submission({})
+        # a becomes the most recently used entry
+        self.assertTrue(await cache.restore('a', dst, self.redis))
+        cache.store('c', src, ['c'])
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'b')))
+        self.assertEqual(cache.total_size, 8)
+
+    async def test_d_store_race(self):
+
+        """test two workers storing the same entry in a shared directory"""
+
+        first = CompileCache(self.cache_dir, 1024)
+        second = CompileCache(self.cache_dir, 1024)
+        first.store('k', self.make_submission({'code': 'first'}), ['code'])
+        second.store('k', self.make_submission({'code': 'second'}), ['code'])
+        # the loser of the race leaves no temporary directory behind
+        self.assertEqual(os.listdir(self.cache_dir), ['k'])
+        self.assertNotIn('k', second.entries)
+
+        dst = self.make_submission({})
+        self.assertTrue(await second.restore('k', dst, self.redis))
+        with open(os.path.join(dst, 'code')) as f:
+            self.assertEqual(f.read(), 'first')
+        self.assertEqual(second.total_size, len('first'))
+
+    async def test_e_evicted_by_another_worker(self):
+
+        """test that an entry removed by another worker is a miss"""
+
+        first = CompileCache(self.cache_dir, 1024)
+        second = CompileCache(self.cache_dir, 1024)
+        first.store('k', self.make_submission({'code': 'binary'}), ['code'])
+        self.assertTrue(await second.restore('k', self.make_submission({}), self.redis))
+        second.drop('k')
+        self.assertFalse(await first.restore('k', self.make_submission({}), self.redis))
+        self.assertNotIn('k', first.entries)
+        self.assertEqual(first.total_size, 0)
+
+    async def test_f_reload(self):
+
+        """test that a new cache indexes the entries on the disk"""
+
+        cache = CompileCache(self.cache_dir, 1024)
+        cache.store('k', self.make_submission({'code': 'binary'}), ['code'])
+        reloaded = CompileCache(self.cache_dir, 1024)
+        self.assertEqual(list(reloaded.entries), ['k'])
+        self.assertEqual(reloaded.total_size, cache.total_size)
+
+if __name__ == "__main__":
+    unittest.main()
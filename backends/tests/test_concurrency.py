@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+from worker.utils.concurrency import JobSlots
+
+class TestJobSlots(unittest.IsolatedAsyncioTestCase):
+
+    """test the slots of the judge jobs"""
+
+    async def wait_for_slot(self, slots: JobSlots, order: list[int], job: int):
+
+        """take a slot and record the order in which it was taken"""
+
+        await slots.acquire()
+        order.append(job)
+
+    async def test_a_acquire(self):
+
+        """test that the jobs past the limit wait until a slot is released"""
+
+        slots = JobSlots(2)
+        await slots.acquire()
+        await slots.acquire()
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        self.assertEqual(slots.active, 2)
+        slots.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        self.assertEqual(slots.active, 2)
+        self.assertEqual(len(slots.waiters), 0)
+
+    async def test_b_handover_order(self):
+
+        """test that the waiting jobs take the slots in the order they arrived"""
+
+        slots = JobSlots(1)
+        await slots.acquire()
+        order: list[int] = []
+        tasks = [asyncio.create_task(self.wait_for_slot(slots, order, job)) for job in range(3)]
+        await asyncio.sleep(0)
+        for _ in range(3):
+            slots.release()
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+        self.assertEqual(order, [0, 1, 2])
+
+    async def test_c_cancel(self):
+
+        """test that a cancelled job leaves the queue and does not keep a slot"""
+
+        slots = JobSlots(1)
+        await slots.acquire()
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(len(slots.waiters), 0)
+        slots.release()
+        self.assertEqual(slots.active, 0)
+
+    async def test_d_cancel_then_release(self):
+
+        """test a release right after the cancellation, before the job resumes"""
+
+        slots = JobSlots(1)
+        await slots.acquire()
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        slots.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(slots.active, 0)
+        self.assertEqual(len(slots.waiters), 0)
+
+    async def test_e_handover_then_cancel(self):
+
+        """test a cancellation right after the slot was handed over"""
+
+        slots = JobSlots(1)
+        await slots.acquire()
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        slots.release()
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(slots.active, 0)
+
+    async def test_f_set_limit(self):
+
+        """test that raising the limit wakes the jobs and lowering it stops no running job"""
+
+        slots = JobSlots(1)
+        await slots.acquire()
+        waiters = [asyncio.create_task(slots.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        slots.set_limit(3)
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout=1)
+        self.assertEqual(slots.active, 3)
+
+        slots.set_limit(1)
+        self.assertEqual(slots.active, 3)
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        slots.release()
+        slots.release()
+        await asyncio.sleep(0)
+        # the two jobs left still exceed the limit
+        self.assertFalse(waiter.done())
+        slots.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        self.assertEqual(slots.active, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import uuid
+from datetime import datetime, timezone
+from redis import asyncio as aioredis
+from api.core.config import settings
+from api.utils.judge_tool import JudgeLane, next_rank, lane_headstart
+
+class TestNextRank(unittest.IsolatedAsyncioTestCase):
+
+    """test the ranks given by NEXT_RANK_SCRIPT to the judge jobs of the users"""
+
+    async def asyncSetUp(self) -> None:
+
+        """connect to redis and pick users no other test uses"""
+
+        self.redis = await aioredis.from_url('redis://localhost:6379/0')
+        self.users = [uuid.uuid4().int % 10 ** 9 for _ in range(2)]
+
+    async def asyncTearDown(self) -> None:
+
+        """remove the ranks of the users"""
+
+        for lane in JudgeLane:
+            for user_id in self.users:
+                await self.redis.delete(f'judge_rank:{lane.value}:{user_id}')
+        await self.redis.close()
+
+    async def test_a_burst_is_spread(self):
+
+        """test that the jobs of a burst are one quantum apart, up to now"""
+
+        quantum = settings.fair_share_quantum
+        ranks = [await next_rank(self.redis, JudgeLane.BULK, self.users[0]) for _ in range(3)]
+        now = datetime.now(timezone.utc).timestamp()
+        # the bulk lane has no head start, so the whole burst is ranked at now
+        for rank in ranks:
+            self.assertAlmostEqual(rank, now, delta=1)
+
+        ranks = [await next_rank(self.redis, JudgeLane.LIVE, self.users[1]) for _ in range(3)]
+        self.assertAlmostEqual(ranks[1] - ranks[0], quantum, delta=0.5)
+        self.assertAlmostEqual(ranks[2] - ranks[1], quantum, delta=0.5)
+
+    async def test_b_other_user_goes_between(self):
+
+        """test that a job of another user is ranked behind at most one job of a burst"""
+
+        burst = [await next_rank(self.redis, JudgeLane.LIVE, self.users[0]) for _ in range(5)]
+        other = await next_rank(self.redis, JudgeLane.LIVE, self.users[1])
+        self.assertGreaterEqual(other, burst[0])
+        self.assertLess(other, burst[1])
+        ahead = [rank for rank in burst if rank <= other]
+        self.assertEqual(len(ahead), 1)
+
+    async def test_c_never_later_than_now(self):
+
+        """test that the rest of a long burst is ranked at now"""
+
+        count = lane_headstart(JudgeLane.LIVE) // settings.fair_share_quantum + 5
+        for _ in range(count):
+            rank = await next_rank(self.redis, JudgeLane.LIVE, self.users[0])
+            self.assertLessEqual(rank, datetime.now(timezone.utc).timestamp())
+
+    async def test_d_lanes_apart(self):
+
+        """test that the lanes keep their own ranks and head starts"""
+
+        live = [await next_rank(self.redis, JudgeLane.LIVE, self.users[0]) for _ in range(3)]
+        rejudge = await next_rank(self.redis, JudgeLane.REJUDGE, self.users[0])
+        bulk = await next_rank(self.redis, JudgeLane.BULK, self.users[0])
+        self.assertLess(live[0], rejudge)
+        self.assertLess(rejudge, bulk)
+        self.assertAlmostEqual(rejudge - live[0], lane_headstart(JudgeLane.LIVE) - lane_headstart(JudgeLane.REJUDGE), delta=1)
+
+    async def test_e_rank_expires(self):
+
+        """test that the rank of a user is kept until it falls behind the ranks given"""
+
+        await next_rank(self.redis, JudgeLane.LIVE, self.users[0])
+        ttl = await self.redis.pttl(f'judge_rank:{JudgeLane.LIVE.value}:{self.users[0]}')
+        self.assertGreater(ttl, 0)
+        self.assertLessEqual(ttl, (settings.fair_share_quantum + 1) * 1000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -81,6 +81,9 @@ class TestProblemEndpoints(unittest.IsolatedAsyncioTestCase):
             parsed_response = ProblemSchemaUser(**response.json()['data'])
         except ValidationError:
             self.fail("The format of user's get problem is incorrect")
+        # the checker may embed the answers
+        self.assertNotIn('checker_code', response.json()['data'])
+        self.assertNotIn('checker_language', response.json()['data'])
 
         # getting the problem as an adim
         default_admin.login()
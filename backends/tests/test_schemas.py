@@ -112,6 +112,24 @@ class SubmissionResponse(BaseModel):
     submission_id: str
     status: Literal['pending', 'success', 'error']
 
+class BulkRejudgeResponse(BaseModel):
+
+    """the format for a response after a bulk rejudge"""
+
+    rejudge_id: str
+    total: int
+
+class BulkRejudgeProgress(BaseModel):
+
+    """the format of the progress of a bulk rejudge"""
+
+    rejudge_id: str
+    state: Literal['running', 'enqueued', 'interrupted', 'failed']
+    created: str
+    total: int
+    enqueued: int
+    judged: int
+
 class GetSubmissionResponse(BaseModel):
 
     """the format of a get submission response"""
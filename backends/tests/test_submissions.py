@@ -8,7 +8,14 @@ from pydantic import ValidationError
 from .settings import TORTOISE_ORM
 from . import utils
 from .user import User
-from .test_schemas import GetSubmissionResponse, SubmissionLogResponse, SubmissionList, SubmissionResponse
+from .test_schemas import (
+    GetSubmissionResponse,
+    SubmissionLogResponse,
+    SubmissionList,
+    SubmissionResponse,
+    BulkRejudgeResponse,
+    BulkRejudgeProgress,
+)
 from shared.schemas import UserCredentials, SubmissionData, SubmissionTestDetail
 
 default_admin = User(1, 'admin', 'admin')
@@ -341,5 +348,57 @@ class TestSubmissionEndpoints(unittest.IsolatedAsyncioTestCase):
         default_admin.logout()
         test_user_1.logout()
 
+    async def test_f_bulk_rejudge(self):
+
+        """test the bulk rejudge endpoints"""
+
+        test_user_1.logout()
+        default_admin.logout()
+        await utils.submission_factory(SUBMISSION_DATA_ADMIN)
+
+        # not an admin -> forbidden
+        test_user_1.login()
+        response = test_user_1.bulk_rejudge({'problem_id': 'p001'})
+        self.assertEqual(response.status_code, requests.codes.forbidden)
+
+        # no filter -> bad request
+        default_admin.login()
+        response = default_admin.bulk_rejudge({})
+        self.assertEqual(response.status_code, requests.codes.bad_request)
+
+        # nothing matched -> not found
+        response = default_admin.bulk_rejudge({'language': 'c'})
+        self.assertEqual(response.status_code, requests.codes.not_found)
+
+        # admin bulk rejudge -> success
+        response = default_admin.bulk_rejudge({'problem_id': 'p001', 'language': 'python'})
+        self.assertEqual(response.status_code, requests.codes.ok)
+        try:
+            parsed_response = BulkRejudgeResponse(**response.json()['data'])
+        except ValidationError:
+            self.fail('the format of the bulk rejudge response is incorrect')
+        self.assertEqual(parsed_response.total, 1)
+
+        time.sleep(20)
+
+        response = default_admin.get_bulk_rejudge(parsed_response.rejudge_id)
+        self.assertEqual(response.status_code, requests.codes.ok)
+        try:
+            progress = BulkRejudgeProgress(**response.json()['data'])
+        except ValidationError:
+            self.fail('the format of the bulk rejudge progress is incorrect')
+        self.assertEqual(progress.state, 'enqueued')
+        self.assertEqual(progress.judged, 1)
+
+        response = default_admin.get_submission_log(SUBMISSION_DATA_ADMIN.submission_id)
+        parsed_log = SubmissionLogResponse(**response.json()['data'])
+        self.assertEqual(parsed_log.score, 30)
+
+        response = default_admin.get_bulk_rejudge('not-a-rejudge')
+        self.assertEqual(response.status_code, requests.codes.not_found)
+
+        default_admin.logout()
+        test_user_1.logout()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import tempfile
+from shared.models import Problem
+from worker.utils import testcase_store
+
+def make_problem(testcases: list[tuple[str, str]]) -> Problem:
+
+    """a problem with its testcases inline, which never reaches the database"""
+
+    return Problem(id='1', testcases=[{'input': i, 'output': o} for i, o in testcases])
+
+def read(path: str) -> str:
+
+    """read a stored file"""
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+class TestTestcaseStore(unittest.IsolatedAsyncioTestCase):
+
+    """test the pins, the eviction and the keys of the testcase store"""
+
+    def setUp(self) -> None:
+
+        """create the directory of the store"""
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tmp_dir.name, 'testcases')
+
+    def tearDown(self) -> None:
+
+        """remove the store"""
+
+        self.tmp_dir.cleanup()
+
+    async def test_a_materialize(self):
+
+        """test that the inputs get the trailing newline and the answers are stored as they are"""
+
+        store = testcase_store.TestcaseStore(self.store_dir, 1024)
+        stored = await store.materialize(make_problem([('1 2', '3'), ('4 5', '9\n')]))
+        self.assertEqual([read(case.input_file) for case in stored], ['1 2\n', '4 5\n'])
+        self.assertEqual([read(case.answer_file) for case in stored], ['3', '9\n'])
+        self.assertEqual(oct(os.stat(self.store_dir).st_mode & 0o777), oct(0o700))
+        store.release(stored)
+        self.assertEqual(store.pins, {})
+
+    async def test_b_key_collision(self):
+
+        """test that an input and an answer with the same text keep their own bytes"""
+
+        store = testcase_store.TestcaseStore(self.store_dir, 1024)
+        echo = await store.materialize(make_problem([('5', '5')]))
+        self.assertEqual(read(echo[0].input_file), '5\n')
+        self.assertEqual(read(echo[0].answer_file), '5')
+
+        # the input of this problem is the answer stored above, and the other way round
+        swapped = await store.materialize(make_problem([('7', '5'), ('5', '7')]))
+        self.assertEqual(read(swapped[0].answer_file), '5')
+        self.assertEqual(read(swapped[1].input_file), '5\n')
+        self.assertEqual(read(swapped[1].answer_file), '7')
+
+    async def test_c_eviction(self):
+
+        """test that the least recently used entries are evicted once the store is full"""
+
+        store = testcase_store.TestcaseStore(self.store_dir, 8)
+        first = await store.materialize(make_problem([('a', 'b')]))
+        store.release(first)
+        second = await store.materialize(make_problem([('c', 'd')]))
+        store.release(second)
+        # 'a\n', 'b', 'c\n' and 'd' fit in the 8 bytes
+        self.assertTrue(all(os.path.exists(path) for path in (*first[0], *second[0])))
+
+        # only the oldest entry has to go for 'e\n' and 'f'
+        third = await store.materialize(make_problem([('e', 'f')]))
+        store.release(third)
+        self.assertFalse(os.path.exists(first[0].input_file))
+        self.assertTrue(all(os.path.exists(path) for path in (first[0].answer_file, *second[0], *third[0])))
+        self.assertLessEqual(store.total_size, 8)
+
+    async def test_d_pins(self):
+
+        """test that the entries of a submission being judged are never evicted"""
+
+        store = testcase_store.TestcaseStore(self.store_dir, 4)
+        pinned = await store.materialize(make_problem([('a', 'b')]))
+        other = await store.materialize(make_problem([('c', 'd')]))
+        # both problems are pinned, so the store stays over its size
+        self.assertTrue(all(os.path.exists(path) for path in (*pinned[0], *other[0])))
+
+        store.release(other)
+        again = await store.materialize(make_problem([('a', 'b')]))
+        self.assertTrue(all(os.path.exists(path) for path in pinned[0]))
+        self.assertFalse(os.path.exists(other[0].input_file))
+        self.assertEqual(store.pins[os.path.basename(pinned[0].input_file)], 2)
+        store.release(pinned)
+        store.release(again)
+        self.assertEqual(store.pins, {})
+
+    async def test_e_reload(self):
+
+        """test that a new store indexes the entries on the disk and drops the unprefixed ones"""
+
+        store = testcase_store.TestcaseStore(self.store_dir, 1024)
+        stored = await store.materialize(make_problem([('1', '2')]))
+        store.release(stored)
+        stale = os.path.join(self.store_dir, 'a' * 64)
+        with open(stale, 'w') as f:
+            f.write('5')
+
+        reloaded = testcase_store.TestcaseStore(self.store_dir, 1024)
+        self.assertEqual(reloaded.total_size, store.total_size)
+        self.assertTrue(reloaded.has(os.path.basename(stored[0].input_file)))
+        self.assertFalse(os.path.exists(stale))
+
+if __name__ == "__main__":
+    unittest.main()
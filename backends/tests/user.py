@@ -137,6 +137,19 @@ class User:
         )
         return response
     
+    def bulk_rejudge(self, filters: dict):
+        response = self.session.post(
+            url='http://localhost:8000/api/judge/rejudges',
+            json=filters,
+        )
+        return response
+    
+    def get_bulk_rejudge(self, rejudge_id: str):
+        response = self.session.get(
+            url=f'http://localhost:8000/api/judge/rejudges/{rejudge_id}',
+        )
+        return response
+    
     def get_submission_log(self, submission_id: str):
         response = self.session.get(
             url=f'http://localhost:8000/api/submissions/{submission_id}/log',
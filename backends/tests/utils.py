@@ -8,7 +8,8 @@ from tortoise import Tortoise
 from redis.asyncio import Redis as AioRedis
 from shared.models import User, UserRole, Problem, Language, Test
 from shared.schemas import UserCredentials, ProblemSchema, LanguageSchema, SubmissionData, SubmissionTestDetail
-from shared.utils import problem_parse, language_parse, submission_parse
+from shared.utils import problem_parse, language_parse, submission_parse, oj_cache
+from shared.db import language_db
 from api.utils import user_tool
 
 async def test_init_large():
@@ -131,7 +132,8 @@ async def language_factory(lan: LanguageSchema, redis: AioRedis):
     language = language_parse.language_schema_to_language(lan)
     await language.save()
 
-    await redis.set(f'language:{lan.name}', lan.model_dump_json())
+    await redis.hset(language_db.LANGUAGE_HASH, lan.name, lan.model_dump_json()) # type: ignore
+    await oj_cache.publish_language_change(redis, lan.name) # type: ignore
 
 async def init_languages(redis: AioRedis):
 
@@ -163,7 +165,8 @@ async def clear_languages(redis: AioRedis):
     """clear all languages in the database and redis"""
 
     await Language.all().delete()
-    await clear_redis_keys('language:*', redis)
+    await redis.delete(language_db.LANGUAGE_HASH)
+    await oj_cache.publish_language_change(redis) # type: ignore
 
 async def clear_user_submission_timestamp(redis: AioRedis):
     
@@ -8,5 +8,75 @@ class Settings:
         # getting each setting by env or a default value
         self.redis_host = os.getenv("REDIS_HOTS", "redis")
         self.max_jobs = int(os.getenv("MAX_JOBS", 5))
+        # the time a judge job may take, including the wait for a job slot
+        self.job_timeout = int(os.getenv("JOB_TIMEOUT", 3600)) # seconds
+
+        # the judge directory inside the worker and its path on the docker host
+        self.judge_dir = os.getenv("JUDGE_DIR", "/judge")
+        self.host_judge_dir = os.getenv("HOST_JUDGE_DIR", "/tmp/judge")
+
+        # the testcases of a submission running at the same time, and the
+        # testcases of all jobs running at the same time
+        self.case_concurrency = int(os.getenv("CASE_CONCURRENCY", 1))
+        self.cpu_slots = int(os.getenv("CPU_SLOTS", os.cpu_count() or 1))
+
+        # a run is stopped once its wall time reaches the time limit times this factor
+        self.wall_time_factor = float(os.getenv("WALL_TIME_FACTOR", 2.0))
+
+        # how the testcases are executed ('container', 'pool', 'batch' or 'session')
+        self.run_mode = os.getenv("RUN_MODE", "container").lower()
+
+        # settings of the warm container pool
+        self.pool_min_idle = int(os.getenv("POOL_MIN_IDLE", 2))
+        self.pool_max_idle = int(os.getenv("POOL_MAX_IDLE", 8))
+        self.pool_idle_timeout = float(os.getenv("POOL_IDLE_TIMEOUT", 300)) # seconds
+        self.pool_health_interval = float(os.getenv("POOL_HEALTH_INTERVAL", 30)) # seconds
+        self.pool_max_uses = int(os.getenv("POOL_MAX_USES", 200))
+        # the uid:gid of the runs in the pooled containers, so a run cannot
+        # leave anything behind for the next user of the container
+        self.pool_run_user = os.getenv("POOL_RUN_USER", "65534:65534")
+
+        # settings of the compile cache
+        self.compile_cache_enabled = os.getenv("COMPILE_CACHE_ENABLED", "True").lower() == "true"
+        self.compile_cache_dir = os.getenv("COMPILE_CACHE_DIR", os.path.join(self.judge_dir, "compile-cache"))
+        self.compile_cache_size = int(os.getenv("COMPILE_CACHE_SIZE", 1024)) # MB
+
+        # the compiled checkers are always cached, since they rarely change
+        self.checker_cache_dir = os.getenv("CHECKER_CACHE_DIR", os.path.join(self.judge_dir, "checker-cache"))
+        self.checker_cache_size = int(os.getenv("CHECKER_CACHE_SIZE", 256)) # MB
+        self.checker_time_limit = float(os.getenv("CHECKER_TIME_LIMIT", 5.0)) # seconds
+
+        # the number of problems kept by the problem cache of the worker
+        self.problem_cache_size = int(os.getenv("PROBLEM_CACHE_SIZE", 128))
+
+        # the max size of the testcase store
+        self.testcase_store_size = int(os.getenv("TESTCASE_STORE_SIZE", 4096)) # MB
+
+        # mount each workspace as a tmpfs of this size (in MB), which needs the
+        # SYS_ADMIN capability and the rshared propagation of the judge directory
+        self.workspace_tmpfs = os.getenv("WORKSPACE_TMPFS", "False").lower() == "true"
+        self.workspace_tmpfs_size = int(os.getenv("WORKSPACE_TMPFS_SIZE", 256))
+
+        # settings of the local backend: the user running the programs if the
+        # worker runs as root, the cgroup v2 directory under which each run gets
+        # its own cgroup (the local languages are refused if empty), and the max
+        # number of processes of a run
+        self.local_run_user = os.getenv("LOCAL_RUN_USER", "nobody")
+        self.local_cgroup_dir = os.getenv("LOCAL_CGROUP_DIR", "")
+        self.local_max_processes = int(os.getenv("LOCAL_MAX_PROCESSES", 64))
+
+        # how often the resource sampler sweeps the running judge processes
+        self.sampler_interval = float(os.getenv("SAMPLER_INTERVAL", 0.05)) # seconds
+
+        # adapt the number of judge jobs running at the same time between
+        # min_jobs and max_jobs to the load of the host: it is lowered while
+        # the cpu usage or the docker latency exceeds its target or the free
+        # memory falls below its share, and raised while all slots are busy
+        self.adaptive_jobs = os.getenv("ADAPTIVE_JOBS", "False").lower() == "true"
+        self.min_jobs = int(os.getenv("MIN_JOBS", 1))
+        self.adaptive_interval = float(os.getenv("ADAPTIVE_INTERVAL", 5)) # seconds
+        self.cpu_target = float(os.getenv("CPU_TARGET", 0.8))
+        self.memory_headroom = float(os.getenv("MEMORY_HEADROOM", 0.15))
+        self.docker_latency_target = float(os.getenv("DOCKER_LATENCY_TARGET", 0.5)) # seconds
 
 settings = Settings()
@@ -0,0 +1,153 @@
+from typing import NamedTuple
+import os
+import aiofiles
+
+# the cgroup v2 files of the container, seen from inside of it
+CGROUP_DIR = '/sys/fs/cgroup'
+
+# records the cpu usage and the uptime around a command, the memory peak and
+# the page cache of the files of the container after it, and writes them to
+# $STATS_FILE as key=value pairs.
+# The command is killed by timeout if $WALL_LIMIT is set, its writes are cut
+# at $OUTPUT_BLOCKS (with a SIGXFSZ, which some programs ignore). If
+# $KILL_LEFTOVERS is set (in the batch harness, which is the init of its
+# container), what the command left running is killed before the stats
+# are written, so it cannot rewrite them
+MEASURE_CMD = """
+read start_up _ < /proc/uptime
+start_cpu=$(grep usage_usec /sys/fs/cgroup/cpu.stat 2> /dev/null)
+(
+    ulimit -t "$CPU_LIMIT"
+    if [ -n "$OUTPUT_BLOCKS" ]; then
+        ulimit -f "$OUTPUT_BLOCKS"
+    fi
+    exec ${WALL_LIMIT:+timeout -k 1 $WALL_LIMIT} sh -c "$RUN_CMD"
+) < "$IN_FILE" > "$OUT_FILE" 2> "$ERR_FILE"
+code="$?"
+read end_up _ < /proc/uptime
+end_cpu=$(grep usage_usec /sys/fs/cgroup/cpu.stat 2> /dev/null)
+peak=$(cat /sys/fs/cgroup/memory.peak 2> /dev/null)
+file=$(grep '^file ' /sys/fs/cgroup/memory.stat 2> /dev/null)
+if [ -n "$KILL_LEFTOVERS" ]; then
+    kill -9 -1 2> /dev/null
+fi
+rm -f "$STATS_FILE"
+echo "code=$code cpu_start=${start_cpu#* } cpu_end=${end_cpu#* } up_start=$start_up up_end=$end_up peak=$peak file=${file#* }" > "$STATS_FILE"
+"""
+
+# the wrapper of a single run, which exits with the code of the command
+RUN_WRAPPER = f"""
+IN_FILE="${{IN_FILE:-/dev/stdin}}"
+OUT_FILE=/workspace/out.txt
+ERR_FILE=/workspace/err.txt
+STATS_FILE=/workspace/stats.txt
+{MEASURE_CMD}
+exit "$code"
+"""
+
+# the harness for the batch mode, which runs every case under /input in one container
+# and writes its files under cases/
+BATCH_HARNESS = f"""
+cd /workspace
+KILL_LEFTOVERS=1
+for IN_FILE in /input/*.in; do
+    name="${{IN_FILE##*/}}"
+    name="cases/${{name%.in}}"
+    OUT_FILE="$name.out"
+    ERR_FILE="$name.err"
+    STATS_FILE="$name.stats"
+    : > "$name.start"
+    {MEASURE_CMD}
+    if [ "$FAIL_FAST" = 1 ] && [ "$code" != 0 ]; then
+        break
+    fi
+done
+"""
+
+# runs the checker in its own container on the input, the answer and the output,
+# bound read-only under /check, and exits with its code (0 means the output is accepted)
+CHECK_WRAPPER = """
+cd /workspace
+exec ${CHECK_LIMIT:+timeout -k 1 $CHECK_LIMIT} sh -c "$CHECK_CMD \\"\\$@\\"" checker \\
+    /check/in.txt /check/ans.txt /check/out.txt < /dev/null > /dev/null 2>&1
+"""
+
+class RunStats(NamedTuple):
+
+    """the resource usage of a run measured through the cgroup of its container"""
+
+    return_code: int
+    cpu_time: float | None   # seconds
+    wall_time: float         # seconds
+    memory_peak: int | None  # MB, for the whole lifetime of the container
+
+def cgroup_memory_peak_supported() -> bool:
+
+    """check if the kernel provides memory.peak in the cgroup v2 hierarchy"""
+
+    return os.path.exists(os.path.join(CGROUP_DIR, 'memory.peak'))
+
+def cpu_limit(time_limit: float) -> int:
+
+    """the cpu limit (in whole seconds) given to ulimit -t for the time limit"""
+
+    return int(time_limit) + 1
+
+def output_blocks(output_limit: int) -> int:
+
+    """the file size limit given to ulimit -f for the output limit (in MB)
+
+    The posix shells (dash, busybox, bash as sh) count the limit in blocks of 512 bytes.
+    """
+
+    return output_limit * 1024 ** 2 // 512
+
+def exceeds_output_limit(output_path: str, output_limit: int) -> bool:
+
+    """check if the output has reached the output limit (in MB), where the writes were cut"""
+
+    try:
+        return os.path.getsize(output_path) >= output_limit * 1024 ** 2
+    except OSError:
+        return False
+
+def memory_without_files(peak: int, file: int) -> int:
+
+    """the memory peak (bytes) of a cgroup in MB, without the page cache of the files
+
+    The pages of the files written by the run (the output above all) are
+    charged to its cgroup, but the memory of a run only counts what the
+    program itself uses, as its rss did. The page cache is taken at the
+    end of the run, when it holds the whole output.
+    """
+
+    return max(peak - file, 0) // 1024 ** 2
+
+async def read_run_stats(stats_path: str) -> RunStats | None:
+
+    """read the stats file written by the wrapper
+
+    This function returns None if the wrapper did not finish writing it.
+    """
+
+    try:
+        async with aiofiles.open(stats_path, 'r', encoding='utf-8') as f:
+            content = await f.read()
+    except FileNotFoundError:
+        return None
+
+    values = dict(item.split('=', 1) for item in content.split() if '=' in item)
+    if not values.get('code') or not values.get('up_end'):
+        return None
+    cpu_time = None
+    if values.get('cpu_start') and values.get('cpu_end'):
+        cpu_time = (int(values['cpu_end']) - int(values['cpu_start'])) / 1_000_000
+    memory_peak = None
+    if values.get('peak'):
+        memory_peak = memory_without_files(int(values['peak']), int(values.get('file') or 0))
+    return RunStats(
+        return_code=int(values['code']),
+        cpu_time=cpu_time,
+        wall_time=float(values['up_end']) - float(values['up_start']),
+        memory_peak=memory_peak,
+    )
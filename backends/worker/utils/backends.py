@@ -0,0 +1,470 @@
+from abc import ABC, abstractmethod
+import logging
+import asyncio
+import json
+import os
+import pwd
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import uuid
+import aiodocker
+from ..core.config import settings
+from .sampler import resource_sampler
+from .container_events import container_events
+from .testcase_store import StoredCase
+from . import accounting
+
+backend_logger = logging.getLogger('backend')
+
+# without memory.peak, the memory is polled by the resource sampler
+CGROUP_MEMORY_PEAK = accounting.cgroup_memory_peak_supported()
+
+# execs each local step, so nothing is set up in a child forked from the threaded worker
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'launcher.py')
+
+def host_path(path: str) -> str:
+
+    """map a path under the judge directory to its path on the docker host"""
+
+    return os.path.join(settings.host_judge_dir, os.path.relpath(path, settings.judge_dir))
+
+class ExecutionBackend(ABC):
+
+    """how the code of a submission is compiled and run, one step at a time
+
+    The workspace is a directory of the worker, and code_dir() is where the
+    program sees the files of the submission.
+    """
+
+    @abstractmethod
+    def code_dir(self, submission_path: str) -> str:
+
+        """the directory of the code, as seen by the compile and run commands"""
+
+    @abstractmethod
+    async def compile(self, submission_path: str, compile_cmd: str) -> bool:
+
+        """compile the code in the submission directory, returning true if it succeeds"""
+
+    @abstractmethod
+    async def run(
+        self,
+        workspace: str,
+        run_cmd: str,
+        time_limit: float,
+        memory_limit: int,
+        output_limit: int,
+        case: StoredCase,
+    ) -> tuple[accounting.RunStats | None, int]:
+
+        """run one testcase in the workspace, writing out.txt next to it
+
+        This function returns the stats of the run (None if it has been
+        stopped by the wall clock cap) and its memory peak in MB.
+        """
+
+class DockerBackend(ExecutionBackend):
+
+    """compile and run in a new container of the language image for each step"""
+
+    def __init__(self, docker: aiodocker.Docker, image_name: str):
+        self.docker = docker
+        self.image_name = image_name
+
+    def code_dir(self, submission_path: str) -> str:
+        return '/workspace'
+
+    async def compile(self, submission_path: str, compile_cmd: str) -> bool:
+        COMPILE_CONFIG = {
+            "Image": self.image_name,
+            "Cmd": compile_cmd.split(),
+            "OpenStdin": False,
+            "AttachStdin": False,
+            "AttachStdout": False,
+            "AttachStderr": False,
+            "HostConfig": {
+                "Binds": [f"{host_path(submission_path)}:/workspace"],
+                "Memory": 128 * 1024 ** 2,
+                "MemorySwap": 256 * 1024 ** 2,
+                "NanoCpus": 2_000_000_000,
+                "LogConfig": {
+                    "Type": "none",
+                },
+            }
+        }
+
+        try:
+            compile_container = await self.docker.containers.create(config=COMPILE_CONFIG)
+        except aiodocker.DockerError:
+            # container creation failed
+            backend_logger.error(f'failed to create the container of {self.image_name}')
+            return False
+
+        # compile the code
+        container_events.expect(compile_container.id)
+        await compile_container.start()
+        result = await container_events.wait(compile_container, timeout=5)
+        await compile_container.delete(force=True)
+        return result['StatusCode'] == 0
+
+    async def run(
+        self,
+        workspace: str,
+        run_cmd: str,
+        time_limit: float,
+        memory_limit: int,
+        output_limit: int,
+        case: StoredCase,
+    ) -> tuple[accounting.RunStats | None, int]:
+
+        """run the testcase in a new container
+
+        The stdin is redirected from the input of the case, which is the only
+        file of the testcase store bound (read-only) in the container. The cpu
+        time and the memory peak are read from the cgroup of the container when
+        the run finishes.
+        """
+
+        env = {
+            "RUN_CMD": run_cmd,
+            "CPU_LIMIT": str(accounting.cpu_limit(time_limit)),
+            "OUTPUT_BLOCKS": str(accounting.output_blocks(output_limit)),
+            "IN_FILE": "/input.txt",
+        }
+        RUN_CONFIG = {
+            "Image": self.image_name,
+            "Cmd": ["sh", "-c", accounting.RUN_WRAPPER],
+            "Env": [f"{key}={value}" for key, value in env.items()],
+            "OpenStdin": False,
+            "AttachStdin": False,
+            "AttachStdout": False,
+            "AttachStderr": False,
+            "HostConfig": {
+                "Binds": [
+                    f"{host_path(workspace)}:/workspace",
+                    f"{host_path(case.input_file)}:/input.txt:ro",
+                ],
+                "Memory": memory_limit * 1024 ** 2,
+                "MemorySwap": memory_limit * 2 * 1024 ** 2,
+                "NanoCpus": 1_000_000_000,
+                "LogConfig": {
+                    "Type": "none",
+                },
+            }
+        }
+
+        # create the container
+        run_container = await self.docker.containers.create(RUN_CONFIG)
+        container_events.expect(run_container.id)
+        await run_container.start()
+
+        sampler_token = None
+        if not CGROUP_MEMORY_PEAK:
+            info = await run_container.show()
+            sampler_token = resource_sampler.watch(info['State']['Pid'])
+
+        stats = None
+        try:
+            result = await container_events.wait(
+                run_container,
+                timeout=time_limit * settings.wall_time_factor,
+            )
+            stats = await accounting.read_run_stats(os.path.join(workspace, 'stats.txt'))
+            if stats is None and result['OOMKilled']:
+                # the wrapper itself was killed before writing the stats
+                stats = accounting.RunStats(
+                    return_code=128 + signal.SIGKILL,
+                    cpu_time=None,
+                    wall_time=0.0,
+                    memory_peak=memory_limit,
+                )
+        except asyncio.TimeoutError:
+            pass
+
+        finally:
+            max_memory = resource_sampler.unwatch(sampler_token)[0] if sampler_token is not None else 0
+            if stats is not None and stats.memory_peak is not None:
+                max_memory = stats.memory_peak
+            await run_container.delete(force=True)
+
+        return stats, max_memory
+
+class LocalBackend(ExecutionBackend):
+
+    """compile and run directly on the worker, for the toolchains installed in it
+
+    Each step is started by the launcher, which moves it into new network,
+    ipc, uts, pid and mount namespaces with a private /proc and /tmp, puts
+    it into a cgroup of its own (for the memory and process limits and the
+    accounting), limits it by rlimits (cpu time and file size) and runs it
+    as an unprivileged user if the worker runs as root. Without a cgroup
+    v2 directory (with the memory, cpu and pids controllers enabled for
+    its children) or the namespaces, nothing left by a step could be
+    killed reliably, so the local languages are refused. There is no
+    container to start, so a run costs a few forks and execs. The judge
+    directory is closed to the unprivileged user, and each step only
+    reaches its own directory, which is its working directory (entered
+    before the user is switched).
+    """
+
+    def __init__(self):
+        self.user: pwd.struct_passwd | None = None
+        if os.geteuid() == 0:
+            self.user = pwd.getpwnam(settings.local_run_user)
+            os.makedirs(settings.judge_dir, exist_ok=True)
+            os.chmod(settings.judge_dir, 0o700)
+        self.cgroup_dir = settings.local_cgroup_dir or None
+        self.isolated = False
+        if self.cgroup_dir is None:
+            backend_logger.warning('no cgroup is configured for the local runs, the local languages are refused')
+        elif not self.probe_namespaces():
+            backend_logger.warning('the local runs cannot be moved into new namespaces, the local languages are refused')
+        else:
+            self.isolated = True
+
+    def launch_cmd(self, cmd: list[str], cgroup: str | None, rlimits: list[tuple[str, int, int]]) -> list[str]:
+
+        """the command of the launcher running the command of a step"""
+
+        config = {
+            "cgroup": cgroup,
+            "rlimits": rlimits,
+            "uid": self.user.pw_uid if self.user is not None else None,
+            "gid": self.user.pw_gid if self.user is not None else None,
+        }
+        return [sys.executable, '-I', '-S', LAUNCHER, json.dumps(config), '--', *cmd]
+
+    def probe_namespaces(self) -> bool:
+
+        """check if the launcher can move a step into new namespaces"""
+
+        try:
+            own_ns = os.readlink('/proc/self/ns/net')
+            child = subprocess.run(
+                self.launch_cmd(['readlink', '/proc/self/ns/net'], None, []),
+                capture_output=True,
+                timeout=5,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        child_ns = child.stdout.decode().strip()
+        return child.returncode == 0 and child_ns != '' and child_ns != own_ns
+
+    def code_dir(self, submission_path: str) -> str:
+        # the steps cannot reach the judge directory by its absolute path
+        return '.'
+
+    def make_cgroup(self, memory_limit: int) -> str:
+
+        """create the cgroup of a step with its limits"""
+
+        assert self.cgroup_dir is not None
+        path = os.path.join(self.cgroup_dir, f'run-{uuid.uuid4().hex}')
+        try:
+            os.mkdir(path)
+            for name, value in (
+                ('memory.max', memory_limit * 1024 ** 2),
+                ('memory.swap.max', 0),
+                ('pids.max', settings.local_max_processes),
+            ):
+                with open(os.path.join(path, name), 'w') as f:
+                    f.write(str(value))
+        except OSError as e:
+            # a step is never run without its cgroup
+            backend_logger.error(f'failed to create the cgroup {path}: {e}')
+            self.remove_cgroup(path)
+            raise
+        return path
+
+    def read_cgroup(self, path: str) -> tuple[float | None, int | None, bool]:
+
+        """read the cpu time, the memory peak (MB) and whether the oom killer was invoked"""
+
+        values: dict[str, str] = {}
+        for name in ('cpu.stat', 'memory.events', 'memory.stat'):
+            try:
+                with open(os.path.join(path, name)) as f:
+                    values.update(line.split(' ', 1) for line in f.read().splitlines() if ' ' in line)
+            except OSError:
+                pass
+        cpu_time = int(values['usage_usec']) / 1_000_000 if 'usage_usec' in values else None
+        memory_peak = None
+        try:
+            with open(os.path.join(path, 'memory.peak')) as f:
+                memory_peak = accounting.memory_without_files(int(f.read()), int(values.get('file', 0)))
+        except (OSError, ValueError):
+            pass
+        return cpu_time, memory_peak, int(values.get('oom_kill', 0)) > 0
+
+    def remove_cgroup(self, path: str):
+
+        """kill what is left in the cgroup and remove it"""
+
+        try:
+            with open(os.path.join(path, 'cgroup.kill'), 'w') as f:
+                f.write('1')
+        except OSError:
+            pass
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            backend_logger.warning(f'failed to remove the cgroup {path}: {e}')
+
+    async def execute(
+        self,
+        cmd: list[str],
+        cwd: str,
+        stdin_path: str,
+        stdout_path: str,
+        stderr_path: str,
+        wall_limit: float,
+        memory_limit: int,
+        output_limit: int,
+        cpu_limit: int | None = None,
+        env: dict[str, str] | None = None,
+    ) -> tuple[accounting.RunStats | None, int]:
+
+        """run the command as a sandboxed process and wait for it
+
+        The launcher is reaped with wait4 in a thread, so there is no
+        polling. The cpu time and the memory peak are read from the cgroup,
+        and the cgroup kills whatever the step has left when it is removed.
+        """
+
+        cgroup = self.make_cgroup(memory_limit)
+        output_bytes = output_limit * 1024 ** 2
+        rlimits = [
+            ('RLIMIT_FSIZE', output_bytes, output_bytes),
+            ('RLIMIT_CORE', 0, 0),
+        ]
+        if cpu_limit is not None:
+            rlimits.append(('RLIMIT_CPU', cpu_limit, cpu_limit + 1))
+
+        start = time.monotonic()
+        try:
+            with open(stdin_path, 'rb') as stdin, open(stdout_path, 'wb') as stdout, \
+            open(stderr_path, 'wb') as stderr:
+                process = subprocess.Popen(
+                    self.launch_cmd(cmd, cgroup, rlimits),
+                    cwd=cwd,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=stderr,
+                    env=env or {'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'HOME': cwd},
+                    start_new_session=True,
+                )
+            waiter = asyncio.ensure_future(asyncio.to_thread(os.wait4, process.pid, 0))
+            timed_out = False
+            try:
+                _, status, _ = await asyncio.wait_for(asyncio.shield(waiter), timeout=wall_limit)
+            except asyncio.TimeoutError:
+                timed_out = True
+                kill_session(process.pid)
+                _, status, _ = await waiter
+            finally:
+                kill_session(process.pid)
+            wall_time = time.monotonic() - start
+            cpu_time, memory, oom_killed = self.read_cgroup(cgroup)
+        finally:
+            # the processes left by the command, even outside of its session
+            self.remove_cgroup(cgroup)
+        exit_code = os.waitstatus_to_exitcode(status)
+        process.returncode = exit_code
+
+        memory = memory or 0
+        return_code = 128 - exit_code if exit_code < 0 else exit_code
+        if oom_killed:
+            return_code = 128 + signal.SIGKILL
+
+        if timed_out:
+            return None, memory
+        return accounting.RunStats(
+            return_code=return_code,
+            cpu_time=cpu_time,
+            wall_time=wall_time,
+            memory_peak=memory,
+        ), memory
+
+    def prepare_dir(self, path: str):
+
+        """let the unprivileged user write into the directory, and keep everyone else out of it"""
+
+        if self.user is not None:
+            os.chown(path, self.user.pw_uid, self.user.pw_gid)
+        os.chmod(path, 0o700)
+
+    async def compile(self, submission_path: str, compile_cmd: str) -> bool:
+
+        """compile the code in a build directory of the unprivileged user
+
+        The files produced by the compilation are moved back into the
+        submission directory, owned by the worker, so a run cannot change
+        the files shared with the other testcases.
+        """
+
+        build_dir = os.path.join(submission_path, 'build')
+        os.mkdir(build_dir)
+        try:
+            for entry in os.scandir(submission_path):
+                if entry.is_file(follow_symlinks=False):
+                    shutil.copy(entry.path, build_dir)
+            self.prepare_dir(build_dir)
+            stats, _ = await self.execute(
+                compile_cmd.split(),
+                cwd=build_dir,
+                stdin_path=os.devnull,
+                stdout_path=os.devnull,
+                stderr_path=os.devnull,
+                wall_limit=5,
+                memory_limit=256,
+                output_limit=64,
+            )
+            if stats is None or stats.return_code != 0:
+                return False
+            for entry in os.scandir(build_dir):
+                target = os.path.join(submission_path, entry.name)
+                if not entry.is_file(follow_symlinks=False) or os.path.exists(target):
+                    continue
+                shutil.move(entry.path, target)
+                os.chown(target, os.geteuid(), os.getegid())
+                os.chmod(target, os.stat(target).st_mode & 0o755)
+            return True
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    async def run(
+        self,
+        workspace: str,
+        run_cmd: str,
+        time_limit: float,
+        memory_limit: int,
+        output_limit: int,
+        case: StoredCase,
+    ) -> tuple[accounting.RunStats | None, int]:
+
+        """run the testcase as a local process with the workspace as its working directory"""
+
+        self.prepare_dir(workspace)
+        return await self.execute(
+            ['sh', '-c', run_cmd],
+            cwd=workspace,
+            stdin_path=case.input_file,
+            stdout_path=os.path.join(workspace, 'out.txt'),
+            stderr_path=os.path.join(workspace, 'err.txt'),
+            wall_limit=time_limit * settings.wall_time_factor,
+            memory_limit=memory_limit,
+            output_limit=output_limit,
+            cpu_limit=accounting.cpu_limit(time_limit),
+        )
+
+def kill_session(pid: int):
+
+    """kill every process of the session led by the pid"""
+
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -0,0 +1,214 @@
+from typing import AsyncIterator
+import hashlib
+import re
+import aiofiles
+from aiofiles.threadpool.text import AsyncTextIOWrapper
+from shared.models import CompareMode
+from shared.utils.output_digest import OutputDigest, normalize_output
+
+# the number of characters read from the output at once
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'\s+')
+
+class PrefixMatcher:
+
+    """match a stream of text against the expected text from the start
+
+    The whitespace passed to hold() is only compared once more text is
+    fed after it, so it can be dropped if nothing but whitespace follows.
+    The held whitespace never grows beyond the rest of the expected text.
+    """
+
+    def __init__(self, expected: str):
+        self.expected = expected
+        self.pos = 0
+        self.pending = ''
+        self.overflow = False   # more whitespace was held than the expected text has left
+        self.failed = False
+
+    def remaining(self) -> int:
+
+        """the number of characters left to match"""
+
+        return len(self.expected) - self.pos
+
+    def feed(self, text: str):
+
+        """compare the held whitespace and the text"""
+
+        if self.failed or not text:
+            return
+        if self.overflow:
+            self.failed = True
+            return
+        segment = self.pending + text
+        if not self.expected.startswith(segment, self.pos):
+            self.failed = True
+            return
+        self.pos += len(segment)
+        self.pending = ''
+
+    def hold(self, whitespace: str):
+
+        """hold the whitespace until it is followed by more text"""
+
+        if len(self.pending) + len(whitespace) > self.remaining():
+            self.overflow = True
+        else:
+            self.pending += whitespace
+
+    def drop(self):
+
+        """drop the held whitespace"""
+
+        self.pending = ''
+        self.overflow = False
+
+    def matched(self) -> bool:
+
+        """check if the whole expected text has been matched"""
+
+        return not self.failed and self.pos == len(self.expected)
+
+class DigestMatcher(PrefixMatcher):
+
+    """match a stream of text against the digest of the expected text
+
+    The text is hashed as it is fed, so the expected text is not needed.
+    Like the prefix matcher, the stream fails as soon as it is longer
+    than the expected text.
+    """
+
+    def __init__(self, digest: OutputDigest):
+        super().__init__('')
+        self.digest = digest
+        self.hash = hashlib.sha256()
+
+    def remaining(self) -> int:
+
+        """the number of characters left to match"""
+
+        return self.digest.length - self.pos
+
+    def feed(self, text: str):
+
+        """hash the held whitespace and the text"""
+
+        if self.failed or not text:
+            return
+        segment = self.pending + text
+        if self.overflow or len(segment) > self.remaining():
+            self.failed = True
+            return
+        self.hash.update(segment.encode())
+        self.pos += len(segment)
+        self.pending = ''
+
+    def matched(self) -> bool:
+
+        """check if the hashed text has the expected digest"""
+
+        return not self.failed and self.pos == self.digest.length \
+            and self.hash.hexdigest() == self.digest.sha256
+
+async def read_chunks(f: AsyncTextIOWrapper) -> AsyncIterator[str]:
+
+    """read the file in chunks of CHUNK_SIZE characters"""
+
+    while chunk := await f.read(CHUNK_SIZE):
+        yield chunk
+
+def split_trailing_whitespace(text: str) -> tuple[str, str]:
+
+    """split the text into its body and its trailing whitespace"""
+
+    body = text.rstrip()
+    return body, text[len(body):]
+
+async def compare_exact(f: AsyncTextIOWrapper, matcher: PrefixMatcher) -> bool:
+
+    """compare the output with the expected text, ignoring the whitespace around it"""
+
+    started = False
+    async for chunk in read_chunks(f):
+        if not started:
+            chunk = chunk.lstrip()
+            started = bool(chunk)
+        body, tail = split_trailing_whitespace(chunk)
+        matcher.feed(body)
+        matcher.hold(tail)
+        if matcher.failed:
+            return False
+    return matcher.matched()
+
+async def compare_tokens(f: AsyncTextIOWrapper, matcher: PrefixMatcher) -> bool:
+
+    """compare the whitespace-separated tokens of the output, joined by single spaces"""
+
+    carry = ''  # a token that may continue in the next chunk
+    async for chunk in read_chunks(f):
+        tokens = WHITESPACE.split(carry + chunk)
+        # the last piece is empty if the chunk ends with whitespace
+        carry = tokens.pop()
+        for token in tokens:
+            if token:
+                matcher.feed(f' {token}' if matcher.pos else token)
+        if matcher.failed or len(carry) > matcher.remaining():
+            # the carry is also bounded by the rest of the expected text
+            return False
+    if carry:
+        matcher.feed(f' {carry}' if matcher.pos else carry)
+    return matcher.matched()
+
+async def compare_trailing(f: AsyncTextIOWrapper, matcher: PrefixMatcher) -> bool:
+
+    """compare the output line by line, ignoring the trailing whitespace of
+    each line and the blank lines at the end"""
+
+    blank_lines = 0   # the newlines held until a line with content comes
+    line_started = False
+    async for chunk in read_chunks(f):
+        lines = chunk.split('\n')
+        for i, line in enumerate(lines):
+            if i > 0:
+                # the previous line has ended, so its trailing whitespace is dropped
+                matcher.drop()
+                blank_lines += 1
+                line_started = False
+            body, tail = split_trailing_whitespace(line)
+            if body:
+                if not line_started and blank_lines:
+                    if blank_lines > matcher.remaining():
+                        return False
+                    # the newlines come before the whitespace held at the start of the line
+                    matcher.pending = '\n' * blank_lines + matcher.pending
+                    blank_lines = 0
+                line_started = True
+                matcher.feed(body)
+            matcher.hold(tail)
+        if matcher.failed:
+            return False
+    return matcher.matched()
+
+async def compare_output(path: str, expected: str | OutputDigest, mode: CompareMode) -> bool:
+
+    """compare the output file with the expected output in the given mode
+
+    The output is read in fixed-size chunks and the comparison stops at
+    the first mismatch, so the memory does not grow with the output. If
+    the expected output is given by its digest, the normalized output is
+    hashed instead of compared.
+    """
+
+    if isinstance(expected, OutputDigest):
+        matcher = DigestMatcher(expected)
+    else:
+        matcher = PrefixMatcher(normalize_output(expected, mode))
+    # the newlines are not translated, since the expected output keeps its \r
+    async with aiofiles.open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        if mode == CompareMode.TOKEN:
+            return await compare_tokens(f, matcher)
+        if mode == CompareMode.TRAILING:
+            return await compare_trailing(f, matcher)
+        return await compare_exact(f, matcher)
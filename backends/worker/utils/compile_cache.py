@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import logging
+import hashlib
+import os
+import shutil
+import uuid
+import aiodocker
+from redis.asyncio import Redis as aioredis
+
+cache_logger = logging.getLogger('compile_cache')
+
+class CompileCache:
+
+    """a content-addressed cache of the compiled files on the local disk
+
+    The files produced by a compilation are stored under a directory named
+    by the hash of the code, the compile command and the image id. The
+    entries are evicted in LRU order once the total size exceeds the limit.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int, name: str = 'compile_cache'):
+        self.cache_dir = cache_dir
+        self.name = name    # the prefix of the redis counters
+        self.max_size = max_size
+        self.entries: OrderedDict[str, int] = OrderedDict() # key -> size in bytes
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+
+        """rebuild the LRU index from the entries already on the disk"""
+
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or entry.name.startswith('tmp-'):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            found.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_size += size
+
+    async def key(
+        self,
+        docker: aiodocker.Docker,
+        code: str,
+        compile_cmd: str,
+        image_name: str,
+    ) -> str:
+
+        """build the cache key of the compilation"""
+
+        image = await docker.images.inspect(image_name)
+        digest = hashlib.sha256()
+        for part in (code, compile_cmd, image['Id']):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    async def restore(self, key: str, dst: str, redis: aioredis) -> bool:
+
+        """copy the cached files into dst
+
+        This function returns true on a hit, returns false on a miss
+        """
+
+        entry_path = os.path.join(self.cache_dir, key)
+        if key not in self.entries and not os.path.isdir(entry_path):
+            self.misses += 1
+            await redis.incr(f'{self.name}:misses')
+            return False
+
+        try:
+            for entry in os.scandir(entry_path):
+                shutil.copy2(entry.path, os.path.join(dst, entry.name))
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # evicted by another worker in the meantime
+            self.drop(key)
+            self.misses += 1
+            await redis.incr(f'{self.name}:misses')
+            return False
+
+        if key not in self.entries:
+            # stored by another worker sharing the directory
+            self.entries[key] = sum(f.stat().st_size for f in os.scandir(entry_path))
+            self.total_size += self.entries[key]
+        self.entries.move_to_end(key)
+        self.hits += 1
+        await redis.incr(f'{self.name}:hits')
+        cache_logger.debug(f'{self.name} hit {key} (hits: {self.hits}, misses: {self.misses})')
+        return True
+
+    def store(self, key: str, src: str, file_names: list[str]):
+
+        """store the compiled files of src in the cache"""
+
+        if key in self.entries or not file_names:
+            return
+        tmp_path = os.path.join(self.cache_dir, f'tmp-{uuid.uuid4().hex}')
+        os.mkdir(tmp_path)
+        size = 0
+        for name in file_names:
+            shutil.copy2(os.path.join(src, name), os.path.join(tmp_path, name))
+            size += os.path.getsize(os.path.join(tmp_path, name))
+        try:
+            os.rename(tmp_path, os.path.join(self.cache_dir, key))
+        except OSError:
+            # the same entry has been stored by another worker
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        self.entries[key] = size
+        self.total_size += size
+        self.evict()
+
+    def drop(self, key: str):
+
+        """remove an entry from the cache"""
+
+        size = self.entries.pop(key, 0)
+        self.total_size -= size
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    def evict(self):
+
+        """evict the least recently used entries until the cache fits"""
+
+        while self.total_size > self.max_size and self.entries:
+            key = next(iter(self.entries))
+            self.drop(key)
+            cache_logger.debug(f'{self.name} entry {key} evicted')
@@ -0,0 +1,158 @@
+from collections import deque
+import logging
+import asyncio
+import time
+import aiodocker
+import psutil
+from ..core.config import settings
+
+concurrency_logger = logging.getLogger('concurrency')
+
+class JobSlots:
+
+    """the slots of the judge jobs, whose number can change while jobs hold them
+
+    The waiting jobs take the slots in the order they arrived, which is
+    the order of the queue. Lowering the limit never stops a running
+    job, the slots are just not handed out again until the jobs holding
+    them fit in the limit.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+
+        """wait for a free slot"""
+
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            elif future in self.waiters:
+                # a release may have dropped the cancelled future already
+                self.waiters.remove(future)
+            raise
+
+    def release(self):
+
+        """free the slot of a finished job"""
+
+        self.active -= 1
+        self.wake()
+
+    def set_limit(self, limit: int):
+
+        """change the number of slots"""
+
+        self.limit = limit
+        self.wake()
+
+    def wake(self):
+
+        """hand the free slots to the waiting jobs"""
+
+        while self.waiters and self.active < self.limit:
+            future = self.waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *args):
+        self.release()
+
+class ConcurrencyController:
+
+    """adapt the slots of the judge jobs to the load of the host
+
+    Every interval the cpu usage and the free memory of the host and the
+    latency of the docker daemon are measured. If any of them is past its
+    target, the timings of the running testcases are at risk, so the
+    limit is cut by a quarter (at least one). Otherwise the limit grows by
+    one if jobs were waiting for a slot, so a big host ends up running as
+    many jobs as it can without slowing them down.
+    """
+
+    def __init__(self, slots: JobSlots, docker: aiodocker.Docker, min_jobs: int, max_jobs: int):
+        self.slots = slots
+        self.docker = docker
+        self.min_jobs = min_jobs
+        self.max_jobs = max_jobs
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+
+        """start adapting the limit"""
+
+        # the first reading of the cpu usage is meaningless
+        psutil.cpu_percent(interval=None)
+        self.task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+
+        """stop adapting the limit"""
+
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def docker_latency(self) -> float:
+
+        """the time the docker daemon takes to answer a trivial request"""
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.docker.version(), timeout=settings.docker_latency_target * 10)
+        except (asyncio.TimeoutError, aiodocker.DockerError):
+            return float('inf')
+        return time.perf_counter() - start
+
+    async def loop(self):
+
+        """measure the load and adjust the limit every interval"""
+
+        while True:
+            busy = False
+            # record whether a job waited for a slot at any point of the interval
+            deadline = time.monotonic() + settings.adaptive_interval
+            while time.monotonic() < deadline:
+                busy = busy or bool(self.slots.waiters)
+                await asyncio.sleep(min(1, settings.adaptive_interval))
+            try:
+                await self.adjust(busy)
+            except Exception as e:
+                concurrency_logger.warning(f'failed to adjust the job slots: {e}')
+
+    async def adjust(self, busy: bool):
+
+        """adjust the limit to the load measured"""
+
+        cpu = psutil.cpu_percent(interval=None) / 100
+        memory = psutil.virtual_memory()
+        free_memory = memory.available / memory.total
+        latency = await self.docker_latency()
+
+        limit = self.slots.limit
+        if cpu > settings.cpu_target or free_memory < settings.memory_headroom or latency > settings.docker_latency_target:
+            limit = max(self.min_jobs, limit - max(1, limit // 4))
+        elif busy:
+            limit = min(self.max_jobs, limit + 1)
+        if limit != self.slots.limit:
+            concurrency_logger.info(
+                f'job slots {self.slots.limit} -> {limit} '
+                f'(cpu {cpu:.0%}, free memory {free_memory:.0%}, docker latency {latency:.3f}s)'
+            )
+            self.slots.set_limit(limit)
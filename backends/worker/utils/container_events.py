@@ -0,0 +1,154 @@
+from typing import Any
+import logging
+import asyncio
+import json
+import aiodocker
+from aiodocker.containers import DockerContainer
+
+events_logger = logging.getLogger('container_events')
+
+# the exit of a container: its exit code and whether it has been killed by the oom killer
+ContainerExit = dict[str, Any]
+
+class ContainerEvents:
+
+    """the exits of the judge containers, read from one subscription to the docker events
+
+    A container is registered with expect() before it starts, and wait()
+    resolves on its die event instead of holding a wait request to the
+    docker daemon for each container. The exits missed while the stream
+    is down are found by inspecting the pending containers once it is
+    back, and by inspecting the container when a wait times out.
+    """
+
+    def __init__(self):
+        self.docker: aiodocker.Docker | None = None
+        self.waiters: dict[str, asyncio.Future[ContainerExit]] = {}
+        self.oom_killed: set[str] = set()
+        self.connected = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.checks: set[asyncio.Task] = set()
+
+    async def start(self, docker: aiodocker.Docker):
+
+        """subscribe to the events and wait until the stream is connected"""
+
+        self.docker = docker
+        self.task = asyncio.create_task(self.listen())
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            events_logger.warning('the docker event stream is not connected yet')
+
+    async def stop(self):
+
+        """unsubscribe from the events"""
+
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def expect(self, container_id: str):
+
+        """register the container, which must be done before it starts"""
+
+        self.waiters[container_id] = asyncio.get_running_loop().create_future()
+
+    async def wait(self, container: DockerContainer, timeout: float) -> ContainerExit:
+
+        """wait until the registered container exits
+
+        This function raises asyncio.TimeoutError if the container is
+        still running after the timeout.
+        """
+
+        future = self.waiters.get(container.id)
+        if future is None:
+            # not registered, or the exit has already been taken
+            self.expect(container.id)
+            future = self.waiters[container.id]
+            self.check_later(container.id)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            # the die event may have been lost
+            await self.check(container.id)
+            if future.done():
+                return future.result()
+            raise
+        finally:
+            if self.waiters.get(container.id) is future:
+                del self.waiters[container.id]
+            self.oom_killed.discard(container.id)
+
+    def resolve(self, container_id: str, exit_code: int, oom_killed: bool):
+
+        """hand the exit of the container to its waiter"""
+
+        future = self.waiters.get(container_id)
+        if future is not None and not future.done():
+            future.set_result({'StatusCode': exit_code, 'OOMKilled': oom_killed})
+
+    def check_later(self, container_id: str):
+
+        """inspect the container in the background"""
+
+        task = asyncio.create_task(self.check(container_id))
+        self.checks.add(task)
+        task.add_done_callback(self.checks.discard)
+
+    async def check(self, container_id: str):
+
+        """inspect the container and resolve its waiter if it has exited"""
+
+        assert self.docker is not None
+        try:
+            info = await self.docker.containers.container(container_id).show()
+        except aiodocker.DockerError:
+            return
+        state = info['State']
+        if state['Status'] in ('exited', 'dead'):
+            self.resolve(container_id, state['ExitCode'], state.get('OOMKilled', False))
+
+    async def listen(self):
+
+        """dispatch the die and oom events, reconnecting if the stream ends"""
+
+        assert self.docker is not None
+        params = {'filters': json.dumps({'type': ['container'], 'event': ['die', 'oom']})}
+        while True:
+            try:
+                async with self.docker._query('events', params=params, timeout=0) as response:
+                    self.connected.set()
+                    # the exits of the pending containers may have been missed
+                    for container_id in list(self.waiters):
+                        self.check_later(container_id)
+                    async for line in response.content:
+                        if line.strip():
+                            self.dispatch(json.loads(line))
+                events_logger.warning('the docker event stream has ended')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                events_logger.warning(f'the docker event stream failed: {e}')
+            self.connected.clear()
+            await asyncio.sleep(1)
+
+    def dispatch(self, event: dict[str, Any]):
+
+        """handle one event of a container"""
+
+        container_id = event.get('Actor', {}).get('ID') or event.get('id')
+        if container_id not in self.waiters:
+            # not a judge container being waited for
+            return
+        action = event.get('Action') or event.get('status')
+        if action == 'oom':
+            self.oom_killed.add(container_id)
+        elif action == 'die':
+            attributes = event.get('Actor', {}).get('Attributes', {})
+            exit_code = int(attributes.get('exitCode', -1))
+            self.resolve(container_id, exit_code, container_id in self.oom_killed)
+
+container_events = ContainerEvents()
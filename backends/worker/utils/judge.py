@@ -1,92 +1,132 @@
-from typing import Any
+from typing import Any, NamedTuple
 import logging
 import asyncio
 import signal
 import aiofiles
 import os
-import time
-import shutil
 import traceback
 import aiodocker
-import psutil
-from aiohttp import client_exceptions
+from aiodocker.containers import DockerContainer
+from aiodocker.stream import Stream
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from redis.asyncio import Redis as aioredis
 from tortoise import Tortoise
-from shared.models import TestResult, Problem, SubmissionStatus
+from shared.models import TestResult, Problem, SubmissionStatus, JudgePolicy, CompareMode, RunBackend
 from shared.schemas import SubmissionTestDetail
 from shared.settings import TORTOISE_ORM
-from shared.db import language_db, submission_db, resolve_db, user_db
-from shared.utils import problem_parse
+from shared.db import language_db, submission_db, resolve_db, user_db, problem_db
+from shared.utils.output_digest import OutputDigest, get_testcase_digests
+from ..core.config import settings
+from .backends import ExecutionBackend, DockerBackend, LocalBackend, host_path
+from .pool import ContainerPool, copy_into_workspace, link_input, IDLE_CMD, RESET_CMD
+from .compile_cache import CompileCache
+from .sampler import resource_sampler
+from .concurrency import JobSlots, ConcurrencyController
+from .container_events import container_events
+from .comparator import compare_output
+from .workspace import make_workspace, remove_workspace
+from .problem_cache import ProblemCache
+from .testcase_store import TestcaseStore, StoredCase, STORE_DIR
+from . import accounting
 
 logging.basicConfig(level=logging.DEBUG)
 judge_logger = logging.getLogger('judge')
-JUDGE_DIR = '/judge'
+JUDGE_DIR = settings.judge_dir
+
+SIG_TIMEOUT = 124 # the return code of timeout when the command times out
+SKIPPED = (TestResult.SKIP, 0.0, 0.0, 0)
+
+# the result of a testcase: status, cpu time, wall time, and memory
+CaseResult = tuple[TestResult, float, float, int]
+
+class Checker(NamedTuple):
+
+    """the checker of a problem, compiled in its own directory outside of the workspaces"""
+
+    image_name: str
+    run_cmd: str
+    path: str  # bound read-only in the container of the checker only
 
 async def startup(ctx: dict[Any, Any]):
 
-    """init aiodocker client, fastapi cache, and tortoise"""
+    """init aiodocker client, the docker events, fastapi cache, tortoise, the sampler, the job slots, the caches and the container pool"""
 
     ctx['docker_client'] = aiodocker.Docker()
+    await container_events.start(ctx['docker_client'])
+    resource_sampler.start()
     await Tortoise.init(TORTOISE_ORM)
     FastAPICache.init(RedisBackend(ctx['redis']), prefix='fastapi-cache')
+    # shared by all jobs, so that the running testcases never exceed the cpu slots
+    ctx['cpu_slots'] = asyncio.Semaphore(settings.cpu_slots)
+    # arq takes up to max_jobs jobs, and the judges running among them are
+    # limited by the job slots, which adapt to the load of the host if enabled
+    if settings.adaptive_jobs:
+        min_jobs = min(settings.min_jobs, settings.max_jobs)
+        ctx['job_slots'] = JobSlots(min(settings.max_jobs, max(min_jobs, settings.cpu_slots)))
+        ctx['concurrency_controller'] = ConcurrencyController(
+            ctx['job_slots'],
+            ctx['docker_client'],
+            min_jobs,
+            settings.max_jobs,
+        )
+        ctx['concurrency_controller'].start()
+    else:
+        ctx['job_slots'] = JobSlots(settings.max_jobs)
+    if settings.compile_cache_enabled:
+        ctx['compile_cache'] = CompileCache(
+            settings.compile_cache_dir,
+            settings.compile_cache_size * 1024 ** 2,
+        )
+    ctx['language_listener'] = asyncio.create_task(language_db.listen_language_changes(ctx['redis']))
+    ctx['problem_cache'] = ProblemCache(settings.problem_cache_size)
+    ctx['problem_cache'].start(ctx['redis'])
+    ctx['local_backend'] = LocalBackend()
+    ctx['testcase_store'] = TestcaseStore(STORE_DIR, settings.testcase_store_size * 1024 ** 2)
+    ctx['checker_cache'] = CompileCache(
+        settings.checker_cache_dir,
+        settings.checker_cache_size * 1024 ** 2,
+        name='checker_cache',
+    )
+    if settings.run_mode == 'pool':
+        # warm up the containers of all registered languages
+        pool = ContainerPool(ctx['docker_client'])
+        languages = await language_db.get_all_languages(ctx['redis'])
+        await pool.start([lan.image_name for lan in languages if lan.backend == RunBackend.DOCKER])
+        ctx['container_pool'] = pool
 
 async def shutdown(ctx: dict[Any, Any]):
 
-    """close the aiodocker client and tortoise"""
+    """close the container pool, the concurrency controller, the cache listeners, the sampler, the docker events, the aiodocker client and tortoise"""
 
+    if 'concurrency_controller' in ctx:
+        await ctx['concurrency_controller'].stop()
+    if 'container_pool' in ctx:
+        await ctx['container_pool'].close()
+    await ctx['problem_cache'].stop()
+    ctx['language_listener'].cancel()
+    await asyncio.gather(ctx['language_listener'], return_exceptions=True)
+    resource_sampler.stop()
+    await container_events.stop()
     await ctx['docker_client'].close()
     await Tortoise.close_connections()
 
-async def compile_code(
-    docker: aiodocker.Docker,
-    image_name: str,
-    compile_cmd: str,
-    submission_id: str,
-) -> bool:
-    
-    """compile the user's code"""
-
-    COMPILE_CONFIG = {
-        "Image": image_name,
-        "Cmd": compile_cmd.split(),
-        "OpenStdin": False,
-        "AttachStdin": False,
-        "AttachStdout": False,
-        "AttachStderr": False,
-        "HostConfig": {
-            "Binds": [f"/tmp/judge/submission{submission_id}:/workspace"],
-            "Memory": 128 * 1024 ** 2,
-            "MemorySwap": 256 * 1024 ** 2,
-            "NanoCpus": 2_000_000_000,
-            "LogConfig": {
-                "Type": "none",
-            },
-        }
-    }
-
-    try:
-        compile_container = await docker.containers.create(config=COMPILE_CONFIG)
-    except aiodocker.DockerError:
-        # container creation failed
-        judge_logger.error(f'failed to create the container of {image_name}')
-        return False
-    
-    # compile the code
-    await compile_container.start()
-    result = await asyncio.wait_for(compile_container.wait(), timeout=5)
-    await compile_container.delete(force=True)
-    return result['StatusCode'] == 0
-
 async def analyze_run_result(
-    output: str,
+    output: str | OutputDigest,
     tle: bool,
     result: dict[str, Any] | None,
     submission_id: str,
+    result_path: str,
+    compare_mode: CompareMode = CompareMode.EXACT,
+    checked: bool = False,
+    check_code: int | None = None,
 ):
     
-    """analyze the run result"""
+    """analyze the run result
+    
+    If checked is true, the verdict of a normal exit is decided by the
+    exit code of the checker, which is None if the checker did not finish.
+    """
 
     SIG_SUCCESS = 0 
 
@@ -101,11 +141,12 @@ async def analyze_run_result(
         return_code -= 128
     if return_code == SIG_SUCCESS:
         # AC or WA
-        result_path = os.path.join(JUDGE_DIR, f'submission{submission_id}', 'out.txt')
-        async with aiofiles.open(result_path, 'r', encoding='utf-8') as f:
-            content = await f.read()
-        code_result = content.strip()
-        if output == code_result:
+        if checked:
+            if check_code is None:
+                judge_logger.error(f'the checker did not run for submission{submission_id}')
+                return TestResult.UNK
+            return TestResult.AC if check_code == 0 else TestResult.WA
+        if await compare_output(result_path, output, compare_mode):
             return TestResult.AC
         else:
             return TestResult.WA
@@ -117,102 +158,576 @@ async def analyze_run_result(
     elif return_code == signal.SIGKILL:
         return TestResult.MLE
     
+    elif return_code == signal.SIGXFSZ:
+        # killed as soon as the output reached the output limit
+        return TestResult.OLE
+    
     else:
         return TestResult.UNK
 
+def exceeds_time_limit(stats: accounting.RunStats, time_limit: float) -> bool:
+
+    """decide the TLE by the cpu time (or the wall time if it is not available)"""
+
+    cpu_time = stats.cpu_time if stats.cpu_time is not None else stats.wall_time
+    return cpu_time > time_limit or stats.return_code - 128 == signal.SIGXCPU
+
+async def collect_run_result(
+    stats: accounting.RunStats | None,
+    time_limit: float,
+    memory: int,
+    output: str | OutputDigest,
+    submission_id: str,
+    result_path: str,
+    compare_mode: CompareMode,
+    output_limit: int | None = None,
+    checked: bool = False,
+    check_code: int | None = None,
+) -> CaseResult:
+    
+    """build the result of a testcase from the stats of the run
+    
+    The stats is None if the run has been stopped by the wall clock cap.
+    An output that has reached the output limit is an OLE whatever the
+    exit status, since a program may ignore SIGXFSZ (CPython does) and
+    exit on the failed write instead.
+    """
+
+    if output_limit is not None and accounting.exceeds_output_limit(result_path, output_limit):
+        cpu_time = time_limit if stats is None or stats.cpu_time is None else stats.cpu_time
+        wall_time = time_limit * settings.wall_time_factor if stats is None else stats.wall_time
+        return TestResult.OLE, cpu_time, wall_time, memory
+
+    if stats is None:
+        status = await analyze_run_result(output, True, None, submission_id, result_path, compare_mode)
+        return status, time_limit, time_limit * settings.wall_time_factor, memory
+
+    cpu_time = stats.cpu_time if stats.cpu_time is not None else stats.wall_time
+    status = await analyze_run_result(
+        output,
+        exceeds_time_limit(stats, time_limit),
+        {'StatusCode': stats.return_code},
+        submission_id,
+        result_path,
+        compare_mode,
+        checked,
+        check_code,
+    )
+    return status, cpu_time, stats.wall_time, memory
+
+async def run_checker(
+    docker: aiodocker.Docker,
+    checker: Checker,
+    case: StoredCase,
+    output_path: str,
+) -> int | None:
+
+    """run the checker in its own container on the output of a run
+
+    The checker, the input, the answer and the output are bound read-only,
+    and the checker runs only after the processes of the run are dead, so
+    the solution never sees the answer or the checker. The exit code of
+    the checker is returned, or None if it did not finish in time.
+    """
+
+    CHECK_CONFIG = {
+        "Image": checker.image_name,
+        "Cmd": ["sh", "-c", accounting.CHECK_WRAPPER],
+        "Env": [
+            f"CHECK_CMD={checker.run_cmd}",
+            f"CHECK_LIMIT={settings.checker_time_limit}",
+        ],
+        "OpenStdin": False,
+        "AttachStdin": False,
+        "AttachStdout": False,
+        "AttachStderr": False,
+        "HostConfig": {
+            "Binds": [
+                f"{host_path(checker.path)}:/workspace:ro",
+                f"{host_path(case.input_file)}:/check/in.txt:ro",
+                f"{host_path(case.answer_file)}:/check/ans.txt:ro",
+                f"{host_path(output_path)}:/check/out.txt:ro",
+            ],
+            "NetworkMode": "none",
+            "Memory": 256 * 1024 ** 2,
+            "MemorySwap": 512 * 1024 ** 2,
+            "NanoCpus": 1_000_000_000,
+            "LogConfig": {
+                "Type": "none",
+            },
+        }
+    }
+
+    check_container = await docker.containers.create(config=CHECK_CONFIG)
+    container_events.expect(check_container.id)
+    try:
+        await check_container.start()
+        result = await container_events.wait(check_container, timeout=settings.checker_time_limit + 5)
+        return result['StatusCode']
+    except asyncio.TimeoutError:
+        judge_logger.warning(f'the checker on {output_path} did not finish in time')
+        return None
+    finally:
+        await check_container.delete(force=True)
+
+async def check_run(
+    docker: aiodocker.Docker,
+    checker: Checker | None,
+    stats: accounting.RunStats | None,
+    case: StoredCase,
+    output_path: str,
+) -> int | None:
+
+    """run the checker if the run exited normally, once its processes have been killed"""
+
+    if checker is None or stats is None or stats.return_code != 0:
+        return None
+    return await run_checker(docker, checker, case, output_path)
+
 async def run_code(
     docker: aiodocker.Docker,
+    backend: ExecutionBackend,
+    run_cmd: str,
+    submission_id: str,
+    workspace: str,
+    memory_limit: int,
+    time_limit: float,
+    output_limit: int,
+    case: StoredCase,
+    output: str | OutputDigest,
+    compare_mode: CompareMode,
+    checker: Checker | None = None,
+) -> CaseResult:
+    
+    """run the code with the corresponding parameters in the workspace
+    
+    The run is left to the backend of the language, and the wall time is
+    capped by the time limit times the wall time factor. If the checker
+    is given, it decides the verdict once the run is over.
+    """
+
+    stats, max_memory = await backend.run(
+        workspace,
+        run_cmd,
+        time_limit,
+        memory_limit,
+        output_limit,
+        case,
+    )
+
+    result_path = os.path.join(workspace, 'out.txt')
+    check_code = await check_run(docker, checker, stats, case, result_path)
+    result = await collect_run_result(
+        stats, time_limit, max_memory, output, submission_id, result_path, compare_mode,
+        output_limit, checker is not None, check_code,
+    )
+
+    return result
+
+async def wait_exec(stream: Stream):
+
+    """wait until the exec process exits
+
+    The output is redirected, so the stream only ends when the process exits.
+    """
+
+    while await stream.read_out() is not None:
+        pass
+
+async def exec_run(
+    container: DockerContainer,
+    workspace: str,
+    input_dir: str,
+    run_cmd: str,
+    time_limit: float,
+    output_limit: int,
+    case: StoredCase,
+    user: str = '',
+) -> tuple[accounting.RunStats | None, int]:
+
+    """run the code with docker exec in a running container, as the user if it is given
+
+    The memory is polled by the resource sampler, since the memory peak
+    of the cgroup covers every step run in the container. The stats are
+    None if the run has been stopped by the wall clock cap. What is left
+    of the run is killed before its files are read, so a background
+    process cannot rewrite them. The input is
+    linked into the input directory, which is bound read-only at /input,
+    since the store is not bound in the container.
+    """
+
+    await link_input(case.input_file, os.path.join(input_dir, 'in.txt'))
+    exec_instance = await container.exec(
+        cmd=["sh", "-c", accounting.RUN_WRAPPER],
+        stdout=True,
+        stderr=True,
+        workdir='/workspace',
+        user=user,
+        environment={
+            "RUN_CMD": run_cmd,
+            "CPU_LIMIT": str(accounting.cpu_limit(time_limit)),
+            "OUTPUT_BLOCKS": str(accounting.output_blocks(output_limit)),
+            "IN_FILE": "/input/in.txt",
+        },
+    )
+    timed_out = False
+    async with exec_instance.start(detach=False) as stream:
+        info = await exec_instance.inspect()
+        sampler_token = resource_sampler.watch(info['Pid'])
+        try:
+            await asyncio.wait_for(
+                wait_exec(stream),
+                timeout=time_limit * settings.wall_time_factor,
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            max_memory = resource_sampler.unwatch(sampler_token)[0]
+    await kill_leftovers(container)
+    if timed_out:
+        return None, max_memory
+    return await accounting.read_run_stats(os.path.join(workspace, 'stats.txt')), max_memory
+
+async def kill_leftovers(container: DockerContainer):
+
+    """kill every process left in the running container, as root, and clear its /tmp"""
+
+    exec_instance = await container.exec(cmd=RESET_CMD, stdout=True, stderr=True)
+    async with exec_instance.start(detach=False) as stream:
+        await wait_exec(stream)
+
+async def run_code_in_pool(
+    docker: aiodocker.Docker,
+    pool: ContainerPool,
     image_name: str,
     run_cmd: str,
     submission_id: str,
     memory_limit: int,
     time_limit: float,
-    input: str,
-    output: str,
-) -> tuple[str, float, int]:
+    output_limit: int,
+    case: StoredCase,
+    output: str | OutputDigest,
+    compare_mode: CompareMode,
+    checker: Checker | None = None,
+) -> CaseResult:
+
+    """run the code in a container borrowed from the warm pool
     
-    """run the code with the corresponding parameters"""
+    What is left of the run is killed before its output is compared or
+    checked.
+    """
+
+    # prepare the workspace of the borrowed container
+    pooled = await pool.acquire(image_name, memory_limit)
+    submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+    copy_into_workspace(submission_path, pooled.workspace)
+
+    try:
+        stats, max_memory = await exec_run(
+            pooled.container, pooled.workspace, pooled.input_dir, run_cmd, time_limit, output_limit, case,
+            settings.pool_run_user,
+        )
+        result_path = os.path.join(pooled.workspace, 'out.txt')
+        check_code = await check_run(docker, checker, stats, case, result_path)
+        result = await collect_run_result(
+            stats, time_limit, max_memory, output, submission_id, result_path, compare_mode,
+            output_limit, checker is not None, check_code,
+        )
+    except aiodocker.DockerError:
+        pooled.healthy = False
+        raise
+    finally:
+        # the release resets the workspace before the container goes back to the pool
+        await pool.release(pooled)
+
+    return result
 
-    RUN_CONFIG = {
+async def start_session(
+    docker: aiodocker.Docker,
+    image_name: str,
+    submission_id: str,
+) -> DockerContainer:
+
+    """start the container shared by the compilation and the runs of the submission
+
+    The main process of the container only keeps it alive, and each step
+    is run with docker exec. The container starts with the limits of the
+    compilation. The inputs are linked into their own directory, which is
+    bound read-only.
+    """
+
+    submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+    input_path = os.path.join(JUDGE_DIR, f'input{submission_id}')
+    os.makedirs(input_path, exist_ok=True)
+    SESSION_CONFIG = {
         "Image": image_name,
-        "Cmd": ["sh", "-c", f"{run_cmd} > /workspace/out.txt 2> /workspace/err.txt"],
-        "OpenStdin": True,
-        "AttachStdin": True,
+        "Cmd": IDLE_CMD,
+        "OpenStdin": False,
+        "AttachStdin": False,
         "AttachStdout": False,
         "AttachStderr": False,
+        "WorkingDir": "/workspace",
         "HostConfig": {
-            "Binds": [f"/tmp/judge/submission{submission_id}:/workspace"],
-            "Memory": memory_limit * 1024 ** 2,
-            "MemorySwap": memory_limit * 2 * 1024 ** 2,
-            "NanoCpus": 1_000_000_000,
+            "Binds": [
+                f"{host_path(submission_path)}:/workspace",
+                f"{host_path(input_path)}:/input:ro",
+            ],
+            "NetworkMode": "none",
+            "Memory": 128 * 1024 ** 2,
+            "MemorySwap": 256 * 1024 ** 2,
+            "NanoCpus": 2_000_000_000,
             "LogConfig": {
                 "Type": "none",
             },
         }
     }
+    session = await docker.containers.create(config=SESSION_CONFIG)
+    try:
+        await session.start()
+    except aiodocker.DockerError:
+        await session.delete(force=True)
+        raise
+    return session
 
-    tle = False
-    time_used = 0
-    max_memory = 0
-    result = None
+async def compile_in_session(session: DockerContainer, compile_cmd: str) -> bool:
 
-    # create the container
-    run_container = await docker.containers.create(RUN_CONFIG)
-    web_socket = await run_container.websocket(stdin=True, stream=True)
-    await run_container.start()
-    
-    # get the pid
-    info = await run_container.show()
-    pid = info['State']['Pid']
+    """compile the code in the session container"""
 
-    async def send():
+    exec_instance = await session.exec(
+        cmd=compile_cmd.split(),
+        stdout=True,
+        stderr=True,
+        workdir='/workspace',
+    )
+    async with exec_instance.start(detach=False) as stream:
+        try:
+            await asyncio.wait_for(wait_exec(stream), timeout=5)
+        except asyncio.TimeoutError:
+            return False
+    info = await exec_instance.inspect()
+    return info['ExitCode'] == 0
 
-        """send the input into the container"""
+async def set_session_limits(docker: aiodocker.Docker, session: DockerContainer, memory_limit: int):
 
-        try:
-            input_with_enter = f'{input}\n'
-            await web_socket.send_bytes(input_with_enter.encode())
-        except client_exceptions.ClientConnectionError:
-            return
+    """switch the session container from the limits of the compilation to the limits of the runs"""
 
-    async def monitor_memory():
-        
-        """monitor the memory with the pid"""
+    await docker._query_json(
+        f'containers/{session.id}/update',
+        method='POST',
+        data={
+            "Memory": memory_limit * 1024 ** 2,
+            "MemorySwap": memory_limit * 2 * 1024 ** 2,
+            "NanoCpus": 1_000_000_000,
+        },
+    )
+
+async def run_code_in_session(
+    docker: aiodocker.Docker,
+    session: DockerContainer,
+    run_cmd: str,
+    submission_id: str,
+    time_limit: float,
+    output_limit: int,
+    case: StoredCase,
+    output: str | OutputDigest,
+    compare_mode: CompareMode,
+    checker: Checker | None = None,
+) -> CaseResult:
 
-        nonlocal max_memory
-        process = psutil.Process(pid)
+    """run the code in the session container, right in the workspace of the submission
+
+    The runs of a session are sequential, since they share the workspace
+    and the cgroup. What is left of a run is killed by exec_run before its
+    files are read, so it cannot rewrite them or reach the next run. An
+    error ends the judge, which removes the whole session.
+    """
+
+    submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+    input_path = os.path.join(JUDGE_DIR, f'input{submission_id}')
+    for name in ('out.txt', 'err.txt', 'stats.txt'):
+        # the files of the previous run
         try:
-            while process.is_running():
-                children = process.children()
-                if children:
-                    target = children[0]
-                    current_memory = target.memory_info().rss // 1024 ** 2
-                else:
-                    current_memory = process.memory_info().rss // 1024 ** 2
-                max_memory = max(max_memory, current_memory)
-                await asyncio.sleep(0.05)
-        except psutil.NoSuchProcess:
-            return
-        
-    monitor_task = asyncio.create_task(monitor_memory())
-    input_task = asyncio.create_task(send())
-    start_time = time.time()
+            os.remove(os.path.join(submission_path, name))
+        except FileNotFoundError:
+            pass
+
+    stats, max_memory = await exec_run(
+        session, submission_path, input_path, run_cmd, time_limit, output_limit, case,
+    )
+
+    result_path = os.path.join(submission_path, 'out.txt')
+    check_code = await check_run(docker, checker, stats, case, result_path)
+    return await collect_run_result(
+        stats, time_limit, max_memory, output, submission_id, result_path, compare_mode,
+        output_limit, checker is not None, check_code,
+    )
+
+async def run_code_in_batch(
+    docker: aiodocker.Docker,
+    image_name: str,
+    run_cmd: str,
+    submission_id: str,
+    memory_limit: int,
+    time_limit: float,
+    output_limit: int,
+    cases: list[StoredCase],
+    expected_outputs: list[str | OutputDigest],
+    fail_fast: bool,
+    compare_mode: CompareMode,
+    checker: Checker | None = None,
+) -> list[CaseResult]:
 
+    """run all testcases of the submission in one container
+    
+    The inputs in the testcase store are linked into a directory bound
+    read-only at /input, and the harness writes the output and the stats
+    of each case into cases/ in the workspace. The harness kills what a
+    case has left running before it writes the stats of the case.
+    If fail_fast is true, the cases after the first failed one are skipped.
+    The harness itself only stops at the first case that does not exit
+    normally, since a WA is only known once the outputs are compared, so
+    the cases after a WA still run and are reported as skipped.
+    The checker runs on the outputs once the container has been removed.
+    """
+
+    submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+    cases_dir = os.path.join(submission_path, 'cases')
+    os.makedirs(cases_dir, exist_ok=True)
+    input_path = os.path.join(JUDGE_DIR, f'input{submission_id}')
+    os.makedirs(input_path, exist_ok=True)
+    for i, case in enumerate(cases):
+        await link_input(case.input_file, os.path.join(input_path, f'{i:04d}.in'))
+
+    BATCH_CONFIG = {
+        "Image": image_name,
+        "Cmd": ["sh", "-c", accounting.BATCH_HARNESS],
+        "Env": [
+            f"RUN_CMD={run_cmd}",
+            f"WALL_LIMIT={time_limit * settings.wall_time_factor}",
+            f"CPU_LIMIT={accounting.cpu_limit(time_limit)}",
+            f"OUTPUT_BLOCKS={accounting.output_blocks(output_limit)}",
+            f"FAIL_FAST={int(fail_fast)}",
+        ],
+        "OpenStdin": False,
+        "AttachStdin": False,
+        "AttachStdout": False,
+        "AttachStderr": False,
+        "HostConfig": {
+            "Binds": [
+                f"{host_path(submission_path)}:/workspace",
+                f"{host_path(input_path)}:/input:ro",
+            ],
+            "Memory": memory_limit * 1024 ** 2,
+            "MemorySwap": memory_limit * 2 * 1024 ** 2,
+            "NanoCpus": 1_000_000_000,
+            "LogConfig": {
+                "Type": "none",
+            },
+        }
+    }
+
+    run_container = await docker.containers.create(config=BATCH_CONFIG)
+    container_events.expect(run_container.id)
     try:
-        result = await asyncio.wait_for(run_container.wait(), timeout=time_limit)
-        time_used = time.time() - start_time
-    except asyncio.TimeoutError:
-        tle = True
-        time_used = time_limit
-        
+        await run_container.start()
+        info = await run_container.show()
+        # the running case is the number of the stats files written so far
+        sampler_token = resource_sampler.watch(
+            info['State']['Pid'],
+            phases=len(cases),
+            phase=lambda: sum(1 for name in os.listdir(cases_dir) if name.endswith('.stats')),
+        )
+        try:
+            # every case may use its whole wall time cap plus the kill grace period
+            await container_events.wait(
+                run_container,
+                timeout=len(cases) * (time_limit * settings.wall_time_factor + 1) + 5,
+            )
+        except asyncio.TimeoutError:
+            judge_logger.warning(f'the batch of submission{submission_id} did not finish in time')
+        finally:
+            max_memory = resource_sampler.unwatch(sampler_token)
     finally:
-        await input_task
-        monitor_task.cancel()
-        
-        status = await analyze_run_result(output, tle, result, submission_id)
         await run_container.delete(force=True)
 
-    return status, time_used, max_memory
+    # build the results from the stats files
+    status_list = []
+    for i in range(len(cases)):
+        name = os.path.join(cases_dir, f'{i:04d}')
+        failed = any(status[0] != TestResult.AC for status in status_list)
+        if not os.path.exists(f'{name}.start') or (fail_fast and failed):
+            # the harness stopped before this case
+            status_list.append(SKIPPED)
+            continue
+        stats = await accounting.read_run_stats(f'{name}.stats')
+        if stats is not None and stats.return_code == SIG_TIMEOUT:
+            # killed by the wall time cap
+            stats = None
+        check_code = await check_run(docker, checker, stats, cases[i], f'{name}.out')
+        status = await collect_run_result(
+            stats,
+            time_limit,
+            max_memory[i],
+            expected_outputs[i],
+            submission_id,
+            f'{name}.out',
+            compare_mode,
+            output_limit,
+            checker is not None,
+            check_code,
+        )
+        status_list.append(status)
+    return status_list
+
+async def prepare_checker(
+    problem: Problem,
+    checker_path: str,
+    docker: aiodocker.Docker,
+    redis: aioredis,
+    checker_cache: CompileCache,
+) -> Checker:
+
+    """put the checker of the problem into its own directory
+
+    The directory stays outside of the workspaces, and it is only bound
+    read-only in the container of the checker.
+
+    The compiled checker is cached by its code, compile command and image,
+    so it is compiled once for each version of the checker.
+    """
+
+    lan_config = await language_db.get_language(problem.checker_language, redis)
+    if lan_config is None:
+        judge_logger.error(f'the checker language {problem.checker_language} does not exist')
+        raise EnvironmentError
+
+    ext = lan_config.file_ext
+    os.makedirs(checker_path, exist_ok=True)
+    async with aiofiles.open(os.path.join(checker_path, f'checker.{ext}'), 'w', encoding='utf-8') as f:
+        await f.write(problem.checker_code)
+
+    src = f'/workspace/checker.{ext}'
+    exe = '/workspace/checker'
+    if lan_config.compile_cmd is not None:
+        compile_cmd = lan_config.compile_cmd.format(src=src, exe=exe)
+        cache_key = await checker_cache.key(docker, problem.checker_code, compile_cmd, lan_config.image_name)
+        if not await checker_cache.restore(cache_key, checker_path, redis):
+            src_files = set(os.listdir(checker_path))
+            backend = DockerBackend(docker, lan_config.image_name)
+            if not await backend.compile(checker_path, compile_cmd):
+                judge_logger.error(f'failed to compile the checker of problem {problem.id}')
+                raise EnvironmentError
+            compiled_files = [
+                entry.name for entry in os.scandir(checker_path)
+                if entry.is_file() and entry.name not in src_files
+            ]
+            checker_cache.store(cache_key, checker_path, compiled_files)
+
+    return Checker(
+        image_name=lan_config.image_name,
+        run_cmd=lan_config.run_cmd.format(src=src, exe=exe),
+        path=checker_path,
+    )
 
 async def judge_code(
     submission_id: str,
@@ -221,9 +736,30 @@ async def judge_code(
     code: str,
     docker: aiodocker.Docker,
     redis: aioredis,
-) -> list[tuple[TestResult, float, int]]:
+    cpu_slots: asyncio.Semaphore,
+    testcase_store: TestcaseStore,
+    pool: ContainerPool | None = None,
+    compile_cache: CompileCache | None = None,
+    checker_cache: CompileCache | None = None,
+    local_backend: LocalBackend | None = None,
+) -> list[CaseResult]:
     
-    """judge the code of the submission"""
+    """judge the code of the submission
+    
+    The testcases are run in parallel (up to the case concurrency), and
+    every running testcase holds one of the cpu slots shared by all jobs.
+    If the container pool is given, the testcases are run in warm
+    containers borrowed from it instead of new containers. In the batch
+    mode, all testcases are run in a single container. With the fail fast
+    policy, the testcases after the first failed one are skipped. If the
+    compile cache is given, the compilation is skipped on a cache hit. If
+    the problem has a checker, the checker decides the verdicts. The
+    runs only get the inputs from the testcase store, and the answers are
+    only given to the checker. In the session mode, the code is compiled
+    and run in one container, one testcase after another. The languages
+    of the local backend are compiled and run on the worker itself, one
+    process for each testcase, whatever the run mode.
+    """
 
     lan_config = await language_db.get_language(language, redis)
     if lan_config is None:
@@ -235,55 +771,198 @@ async def judge_code(
     ext = lan_config.file_ext
     file_name = f'code.{ext}'
     submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
-    if not os.path.exists(submission_path):
-        os.mkdir(submission_path)
+    await make_workspace(submission_path)
     async with aiofiles.open(os.path.join(submission_path, file_name), 'w', encoding='utf-8') as f:
         await f.write(code)
 
-    prob = problem_parse.problem_to_problem_schema(problem)
-    src = f'/workspace/code.{ext}'
-    exe = '/workspace/code'
-    if lan_config.compile_cmd is not None:
-        compile_cmd = lan_config.compile_cmd.format(src=src, exe=exe)
-        cmp_success = await compile_code(
-            docker=docker,
-            image_name=lan_config.image_name,
-            compile_cmd=compile_cmd,
-            submission_id=submission_id,
-        )
-        if not cmp_success:
-            shutil.rmtree(submission_path)
-            return [(TestResult.CE, 0.0, 0)] * len(prob.testcases)
+    local = lan_config.backend == RunBackend.LOCAL
+    if local and (local_backend is None or not local_backend.isolated):
+        # without the namespaces and the cgroups, a run could reach the worker or outlive the judge
+        judge_logger.error(f'the local backend of {language} is not available')
+        raise EnvironmentError
+    backend: ExecutionBackend = local_backend if local else DockerBackend(docker, lan_config.image_name) # type: ignore
+    if local:
+        # the cache key is built from the image of the language
+        compile_cache = None
+        # the runs only reach their own directories from their working directories
+        os.chmod(submission_path, 0o700)
+
+    case_count = problem_db.testcase_count(problem)
+    code_dir = backend.code_dir(submission_path)
+    src = f'{code_dir}/code.{ext}'
+    exe = f'{code_dir}/code'
+    checker_path = os.path.join(JUDGE_DIR, f'checker{submission_id}')
+    input_path = os.path.join(JUDGE_DIR, f'input{submission_id}')
+    session = None
+    if settings.run_mode == 'session' and not local:
+        # the compilation and the runs share one container
+        session = await start_session(docker, lan_config.image_name, submission_id)
+    try:
+        if lan_config.compile_cmd is not None:
+            compile_cmd = lan_config.compile_cmd.format(src=src, exe=exe)
+            cache_hit = False
+            if compile_cache is not None:
+                cache_key = await compile_cache.key(docker, code, compile_cmd, lan_config.image_name)
+                cache_hit = await compile_cache.restore(cache_key, submission_path, redis)
+            if not cache_hit:
+                src_files = set(os.listdir(submission_path))
+                if session is not None:
+                    cmp_success = await compile_in_session(session, compile_cmd)
+                else:
+                    cmp_success = await backend.compile(submission_path, compile_cmd)
+                if not cmp_success:
+                    await remove_workspace(submission_path)
+                    return [(TestResult.CE, 0.0, 0.0, 0)] * case_count
+                if compile_cache is not None:
+                    # cache the files produced by the compilation
+                    compiled_files = [
+                        entry.name for entry in os.scandir(submission_path)
+                        if entry.is_file() and entry.name not in src_files
+                    ]
+                    compile_cache.store(cache_key, submission_path, compiled_files)
         
-    time_limit = prob.time_limit
-    if time_limit is None:
-        time_limit = lan_config.time_limit
-    memory_limit = prob.memory_limit
-    if memory_limit is None:
-        memory_limit = lan_config.memory_limit
-
-    # iterate through all tests
-    status_list = []
-    run_cmd = lan_config.run_cmd.format(src=src, exe=exe)
-    for case in prob.testcases:
-        status = await run_code(
-            docker=docker,
-            image_name=lan_config.image_name,
-            run_cmd=run_cmd,
-            submission_id=submission_id,
-            memory_limit=memory_limit,
-            time_limit=time_limit,
-            input=case.input,
-            output=case.output,
-        )
-        status_list.append(status)
+        time_limit = problem.time_limit
+        if time_limit is None:
+            time_limit = lan_config.time_limit
+        memory_limit = problem.memory_limit
+        if memory_limit is None:
+            memory_limit = lan_config.memory_limit
+        output_limit = problem.output_limit
+        if output_limit is None:
+            output_limit = lan_config.output_limit
+        judge_policy = problem.judge_policy
+        if judge_policy is None:
+            judge_policy = lan_config.judge_policy
+        fail_fast = judge_policy == JudgePolicy.FAIL_FAST
+        compare_mode = CompareMode(problem.compare_mode)
+        checker = None
+        if problem.checker_code is not None and problem.checker_language is not None:
+            assert checker_cache is not None
+            checker = await prepare_checker(problem, checker_path, docker, redis, checker_cache)
+        # the digests replace the expected outputs if they were computed for the mode,
+        # so the testcases are only loaded from the database without them
+        digests = get_testcase_digests(problem.output_digests, compare_mode)
+        expected_outputs: list[str | OutputDigest]
+        if checker is not None:
+            # the checker reads the expected outputs from the store
+            expected_outputs = [''] * case_count
+        elif digests is not None and len(digests) == case_count:
+            expected_outputs = list(digests)
+        else:
+            expected_outputs = [case.output for case in await problem_db.get_testcases(problem)]
 
-    judge_logger.info(f'submission {submission_id} judged successfuly')
-    # remove the files
-    shutil.rmtree(submission_path)
-    return status_list
+        # iterate through all tests
+        run_cmd = lan_config.run_cmd.format(src=src, exe=exe)
+        stored_cases = await testcase_store.materialize(problem)
+        try:
+            if settings.run_mode == 'batch' and not local:
+                async with cpu_slots:
+                    status_list = await run_code_in_batch(
+                        docker=docker,
+                        image_name=lan_config.image_name,
+                        run_cmd=run_cmd,
+                        submission_id=submission_id,
+                        memory_limit=memory_limit,
+                        time_limit=time_limit,
+                        output_limit=output_limit,
+                        cases=stored_cases,
+                        expected_outputs=expected_outputs,
+                        fail_fast=fail_fast,
+                        compare_mode=compare_mode,
+                        checker=checker,
+                    )
+            elif session is not None:
+                await set_session_limits(docker, session, memory_limit)
+                status_list = []
+                for case_id, case in enumerate(stored_cases):
+                    if fail_fast and any(status[0] != TestResult.AC for status in status_list):
+                        # an earlier testcase has failed
+                        status_list.append(SKIPPED)
+                        continue
+                    async with cpu_slots:
+                        status_list.append(await run_code_in_session(
+                            docker=docker,
+                            session=session,
+                            run_cmd=run_cmd,
+                            submission_id=submission_id,
+                            time_limit=time_limit,
+                            output_limit=output_limit,
+                            case=case,
+                            output=expected_outputs[case_id],
+                            compare_mode=compare_mode,
+                            checker=checker,
+                        ))
+            else:
+                case_slots = asyncio.Semaphore(settings.case_concurrency)
+                first_failed = case_count
 
-def get_score_counts_logs(results: list[tuple[TestResult, float, int]]) -> tuple[int, int, list[SubmissionTestDetail]]:
+                async def run_case(case_id: int, case: StoredCase) -> CaseResult:
+
+                    """run one testcase once a slot of the submission and a cpu slot are free"""
+
+                    nonlocal first_failed
+                    async with case_slots, cpu_slots:
+                        if fail_fast and case_id > first_failed:
+                            # an earlier testcase has failed
+                            return SKIPPED
+
+                        if pool is not None and not local:
+                            status = await run_code_in_pool(
+                                docker=docker,
+                                pool=pool,
+                                image_name=lan_config.image_name,
+                                run_cmd=run_cmd,
+                                submission_id=submission_id,
+                                memory_limit=memory_limit,
+                                time_limit=time_limit,
+                                output_limit=output_limit,
+                                case=case,
+                                output=expected_outputs[case_id],
+                                compare_mode=compare_mode,
+                                checker=checker,
+                            )
+                        else:
+                            # each testcase has its own copy of the code
+                            workspace = os.path.join(submission_path, f'case{case_id}')
+                            os.mkdir(workspace)
+                            copy_into_workspace(submission_path, workspace)
+                            status = await run_code(
+                                docker=docker,
+                                backend=backend,
+                                run_cmd=run_cmd,
+                                submission_id=submission_id,
+                                workspace=workspace,
+                                memory_limit=memory_limit,
+                                time_limit=time_limit,
+                                output_limit=output_limit,
+                                case=case,
+                                output=expected_outputs[case_id],
+                                compare_mode=compare_mode,
+                                checker=checker,
+                            )
+                        if status[0] != TestResult.AC:
+                            first_failed = min(first_failed, case_id)
+                        return status
+
+                # gather keeps the order of the testcases
+                status_list = list(await asyncio.gather(
+                    *[run_case(i, case) for i, case in enumerate(stored_cases)]
+                ))
+        finally:
+            testcase_store.release(stored_cases)
+
+        judge_logger.info(f'submission {submission_id} judged successfuly')
+        # remove the files
+        await remove_workspace(submission_path)
+        return status_list
+    finally:
+        if session is not None:
+            await session.delete(force=True)
+        for path in (checker_path, input_path):
+            if os.path.exists(path):
+                await remove_workspace(path)
+
+def get_score_counts_logs(results: list[CaseResult]) -> tuple[int, int, list[SubmissionTestDetail]]:
 
     """get the score, counts, and logs from the result list"""
 
@@ -296,7 +975,8 @@ def get_score_counts_logs(results: list[tuple[TestResult, float, int]]) -> tuple
                 test_id=i + 1,
                 result=results[i][0],
                 time=results[i][1],
-                memory=results[i][2],
+                wall_time=results[i][2],
+                memory=results[i][3],
             )
         )
         if results[i][0] == TestResult.AC:
@@ -343,62 +1023,110 @@ async def update_resolve_relation(
 async def judge_task(
     ctx: dict[Any, Any],
     submission_id: str,
+    generation: int | None = None,
 ):
     
-    """judge/rejudge the code"""
+    """judge/rejudge the code
 
-    # get the submission
-    submission = await submission_db.get_submission_in_db(submission_id)
-    if submission is None:
-        # the submission does not exist
-        judge_logger.error(f'the submission {submission_id} does not exist')
-        return
-    
-    submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+    The job judges a generation of the submission. If the submission has
+    been rejudged since the job was enqueued, the job is skipped, and if
+    it is rejudged while the job runs, the results are discarded. If the
+    job is cancelled (by the job timeout of arq or the shutdown of the
+    worker), the submission is marked as an error instead of being left
+    pending.
+    """
 
-    # judge the code
     try:
-        problem = await submission.problem.first()
-        results = await judge_code(
-            submission_id=submission_id,
-            language=submission.language,
-            problem=problem,
-            code=submission.code,
-            docker=ctx['docker_client'],
-            redis=ctx['redis'],
-        )
-        score, counts, submission_logs = get_score_counts_logs(results)
-        await submission_db.update_submission_in_db(
-            submission=submission,
-            status=SubmissionStatus.SUCCESS,
-            score=score,
-            counts=counts,
-            tests=submission_logs,
-        )
-        await update_resolve_relation(
-            problem_id=submission.problem_id, #type: ignore
-            user_id=submission.user_id, #type: ignore
-            language=submission.language,
-            score=score,
-            counts=counts
-        )
-    except EnvironmentError:
-        await submission_db.update_submission_in_db(
-            submission=submission,
-            status=SubmissionStatus.ERROR,
-        )
-        if os.path.exists(submission_path):
-            shutil.rmtree(submission_path)
-        judge_logger.error(f'judge of submission {submission_id} failed due to database error')
-        tb_str = traceback.format_exc()
-        judge_logger.debug(f'Traceback: {tb_str}')
-    except Exception as e:
-        judge_logger.error(f'judge of submission {submission_id} failed due to unknown error')
-        await submission_db.update_submission_in_db(
-            submission=submission,
-            status=SubmissionStatus.ERROR,
-        )
-        if os.path.exists(submission_path):
-            shutil.rmtree(submission_path)
-        tb_str = traceback.format_exc()
-        judge_logger.debug(f'Catching the exception: {str(e)} when judging submission{submission_id}. Traceback: {tb_str}')
+        await judge_submission(ctx, submission_id, generation)
+    except asyncio.CancelledError:
+        judge_logger.error(f'judge of submission {submission_id} cancelled')
+        submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+        await asyncio.shield(asyncio.gather(
+            submission_db.fail_pending_submission(submission_id, generation),
+            remove_workspace(submission_path),
+            return_exceptions=True,
+        ))
+        raise
+
+async def judge_submission(
+    ctx: dict[Any, Any],
+    submission_id: str,
+    generation: int | None,
+):
+
+    """judge the generation of the submission once a job slot is free"""
+
+    # wait for a job slot, so a rejudge arriving meanwhile is seen before judging
+    async with ctx['job_slots']:
+        # get the submission
+        submission = await submission_db.get_submission_in_db(submission_id)
+        if submission is None:
+            # the submission does not exist
+            judge_logger.error(f'the submission {submission_id} does not exist')
+            return
+        if generation is not None and submission.judge_generation != generation:
+            judge_logger.info(f'judge of submission {submission_id} (generation {generation}) superseded')
+            return
+    
+        submission_path = os.path.join(JUDGE_DIR, f'submission{submission_id}')
+
+        # judge the code
+        try:
+            problem = await ctx['problem_cache'].get(submission.problem_id) #type: ignore
+            if problem is None:
+                judge_logger.error(f'the problem of submission {submission_id} does not exist')
+                raise EnvironmentError
+            results = await judge_code(
+                submission_id=submission_id,
+                language=submission.language,
+                problem=problem,
+                code=submission.code,
+                docker=ctx['docker_client'],
+                redis=ctx['redis'],
+                cpu_slots=ctx['cpu_slots'],
+                testcase_store=ctx['testcase_store'],
+                pool=ctx.get('container_pool'),
+                compile_cache=ctx.get('compile_cache'),
+                checker_cache=ctx['checker_cache'],
+                local_backend=ctx['local_backend'],
+            )
+            score, counts, submission_logs = get_score_counts_logs(results)
+            if not await submission_db.update_submission_in_db(
+                submission=submission,
+                status=SubmissionStatus.SUCCESS,
+                score=score,
+                counts=counts,
+                tests=submission_logs,
+                generation=generation,
+            ):
+                judge_logger.info(f'results of submission {submission_id} (generation {generation}) discarded')
+                return
+            await update_resolve_relation(
+                problem_id=submission.problem_id, #type: ignore
+                user_id=submission.user_id, #type: ignore
+                language=submission.language,
+                score=score,
+                counts=counts
+            )
+        except EnvironmentError:
+            await submission_db.update_submission_in_db(
+                submission=submission,
+                status=SubmissionStatus.ERROR,
+                generation=generation,
+            )
+            if os.path.exists(submission_path):
+                await remove_workspace(submission_path)
+            judge_logger.error(f'judge of submission {submission_id} failed due to database error')
+            tb_str = traceback.format_exc()
+            judge_logger.debug(f'Traceback: {tb_str}')
+        except Exception as e:
+            judge_logger.error(f'judge of submission {submission_id} failed due to unknown error')
+            await submission_db.update_submission_in_db(
+                submission=submission,
+                status=SubmissionStatus.ERROR,
+                generation=generation,
+            )
+            if os.path.exists(submission_path):
+                await remove_workspace(submission_path)
+            tb_str = traceback.format_exc()
+            judge_logger.debug(f'Catching the exception: {str(e)} when judging submission{submission_id}. Traceback: {tb_str}')
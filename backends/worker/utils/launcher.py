@@ -0,0 +1,109 @@
+"""the launcher of a step of the local backend
+
+The local backend execs this script as root instead of setting up the
+step in a child forked from the worker, which has threads. The launcher
+moves into new network, ipc, uts, pid and mount namespaces and forks the
+step, which joins its cgroup, mounts a private /proc and /tmp, sets its
+rlimits, drops to the run user and execs the command. The command is the
+init of its pid namespace, so every process it leaves behind is killed
+when it exits.
+
+usage: launcher.py CONFIG -- CMD...
+
+CONFIG is a json object with the cgroup of the step (or null), the
+rlimits as [name, soft, hard] lists, and the uid and gid (or null).
+It only uses the standard library, since it runs outside of the package.
+"""
+
+import ctypes
+import json
+import os
+import resource
+import sys
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+def check(result: int):
+
+    """raise the errno of a failed libc call"""
+
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def mount(source: str | None, target: str, fstype: str | None, flags: int, data: str | None = None):
+
+    """mount a filesystem with the mount syscall"""
+
+    check(libc.mount(
+        source.encode() if source else None,
+        target.encode(),
+        fstype.encode() if fstype else None,
+        ctypes.c_ulong(flags),
+        data.encode() if data else None,
+    ))
+
+def find_program(name: str) -> str:
+
+    """find the program in the PATH, like the shells do"""
+
+    if '/' in name:
+        return name
+    for directory in os.environ.get('PATH', '/usr/bin:/bin').split(':'):
+        path = os.path.join(directory, name)
+        if os.access(path, os.X_OK):
+            return path
+    return name
+
+def start_step(config: dict, cmd: list[str]):
+
+    """set up the step in its namespaces and exec the command"""
+
+    if config['cgroup'] is not None:
+        # 0 is the writing process itself, whatever its pid namespace
+        with open(os.path.join(config['cgroup'], 'cgroup.procs'), 'w') as f:
+            f.write('0')
+    # the /proc of the pid namespace only shows the processes of the step
+    mount('proc', '/proc', 'proc', MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    mount('tmpfs', '/tmp', 'tmpfs', MS_NOSUID | MS_NODEV, 'size=64m,mode=1777')
+    # looked up before the user is switched, since the lookup of execvp imports a module
+    program = find_program(cmd[0])
+    for name, soft, hard in config['rlimits']:
+        resource.setrlimit(getattr(resource, name), (soft, hard))
+    if config['uid'] is not None:
+        os.setgroups([])
+        os.setgid(config['gid'])
+        os.setuid(config['uid'])
+    os.execv(program, cmd)
+
+def main():
+    config = json.loads(sys.argv[1])
+    cmd = sys.argv[3:]
+    check(libc.unshare(CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS | CLONE_NEWPID | CLONE_NEWNS))
+    # the mounts of the step never reach the worker
+    mount(None, '/', None, MS_REC | MS_PRIVATE)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            start_step(config, cmd)
+        except BaseException as e:
+            print(f'launcher: {e}', file=sys.stderr)
+        os._exit(127)
+    _, status = os.waitpid(pid, 0)
+    code = os.waitstatus_to_exitcode(status)
+    # a signal is reported like the shells do
+    sys.exit(128 - code if code < 0 else code)
+
+if __name__ == '__main__':
+    main()
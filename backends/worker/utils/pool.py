@@ -0,0 +1,276 @@
+from typing import Any
+from dataclasses import dataclass, field
+import logging
+import asyncio
+import os
+import shutil
+import time
+import uuid
+import aiodocker
+from aiodocker.containers import DockerContainer
+from ..core.config import settings
+from .workspace import make_workspace, remove_workspace
+
+pool_logger = logging.getLogger('pool')
+
+# the main process of a pooled container only keeps it alive
+IDLE_CMD = ["sh", "-c", "trap 'exit 0' TERM; while :; do sleep 3600; done"]
+# run as root, since the runs of the pool run as an unprivileged user
+RESET_CMD = ["sh", "-c", "kill -9 -1 2> /dev/null; rm -rf /tmp/* /tmp/.[!.]* /tmp/..?* /dev/shm/* 2> /dev/null; true"]
+
+@dataclass
+class PooledContainer:
+
+    """a warm container, the workspace bound to it and the directory of its inputs"""
+
+    container: DockerContainer
+    image_name: str
+    slot: str
+    uses: int = 0
+    memory_limit: int | None = None
+    last_used: float = field(default_factory=time.monotonic)
+    healthy: bool = True
+
+    @property
+    def workspace(self) -> str:
+
+        """the workspace of the container seen by the worker"""
+
+        return os.path.join(settings.judge_dir, 'pool', self.slot)
+
+    @property
+    def input_dir(self) -> str:
+
+        """the directory of the inputs, bound read-only at /input"""
+
+        return os.path.join(settings.judge_dir, 'pool', f'{self.slot}.input')
+
+class ContainerPool:
+
+    """a pool of idle, network-less containers for each language image
+
+    Each testcase borrows a container with acquire(), runs its command with
+    docker exec, and gives the container back with release(). The workspace
+    of the container is reset before it goes back to the pool. The rootfs
+    of the containers is read-only and /tmp is a tmpfs, and the runs are
+    executed as the pool run user, so the reset clears all they can write.
+    """
+
+    def __init__(self, docker: aiodocker.Docker):
+        self.docker = docker
+        self.idle: dict[str, list[PooledContainer]] = {}
+        self.maintain_task: asyncio.Task | None = None
+
+    async def start(self, image_names: list[str]):
+
+        """warm up the pool for the images and start the maintenance loop"""
+
+        os.makedirs(os.path.join(settings.judge_dir, 'pool'), exist_ok=True)
+        warm_tasks = [self.fill(image_name) for image_name in set(image_names)]
+        await asyncio.gather(*warm_tasks)
+        self.maintain_task = asyncio.create_task(self.maintain())
+
+    async def close(self):
+
+        """stop the maintenance loop and remove all idle containers"""
+
+        if self.maintain_task is not None:
+            self.maintain_task.cancel()
+        containers = [pc for pcs in self.idle.values() for pc in pcs]
+        self.idle.clear()
+        await asyncio.gather(*[self.discard(pc) for pc in containers])
+
+    async def create(self, image_name: str) -> PooledContainer:
+
+        """create and start a new pooled container"""
+
+        slot = uuid.uuid4().hex
+        workspace = os.path.join(settings.judge_dir, 'pool', slot)
+        await make_workspace(workspace)
+        # the runs write their outputs into the workspace
+        uid, gid = run_user_ids()
+        os.chown(workspace, uid, gid)
+        os.makedirs(f'{workspace}.input', exist_ok=True)
+        POOL_CONFIG = {
+            "Image": image_name,
+            "Cmd": IDLE_CMD,
+            "OpenStdin": False,
+            "AttachStdin": False,
+            "AttachStdout": False,
+            "AttachStderr": False,
+            "WorkingDir": "/workspace",
+            "HostConfig": {
+                "Binds": [
+                    f"{settings.host_judge_dir}/pool/{slot}:/workspace",
+                    f"{settings.host_judge_dir}/pool/{slot}.input:/input:ro",
+                ],
+                "ReadonlyRootfs": True,
+                "Tmpfs": {"/tmp": "rw,exec,nosuid,nodev,size=64m"},
+                "NetworkMode": "none",
+                "NanoCpus": 1_000_000_000,
+                "LogConfig": {
+                    "Type": "none",
+                },
+            }
+        }
+        container = await self.docker.containers.create(config=POOL_CONFIG)
+        await container.start()
+        return PooledContainer(container=container, image_name=image_name, slot=slot)
+
+    async def fill(self, image_name: str):
+
+        """create containers until the image has the min number of idle ones"""
+
+        idle = self.idle.setdefault(image_name, [])
+        missing = settings.pool_min_idle - len(idle)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(
+            *[self.create(image_name) for _ in range(missing)],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, PooledContainer):
+                idle.append(result)
+            else:
+                pool_logger.error(f'failed to warm a container of {image_name}: {result}')
+
+    async def acquire(self, image_name: str, memory_limit: int) -> PooledContainer:
+
+        """borrow an idle container of the image, creating one if there is none"""
+
+        idle = self.idle.setdefault(image_name, [])
+        pooled = idle.pop() if idle else await self.create(image_name)
+        if pooled.memory_limit != memory_limit:
+            # the limit of a running container can be changed in place
+            await self.docker._query_json(
+                f'containers/{pooled.container.id}/update',
+                method='POST',
+                data={
+                    "Memory": memory_limit * 1024 ** 2,
+                    "MemorySwap": memory_limit * 2 * 1024 ** 2,
+                },
+            )
+            pooled.memory_limit = memory_limit
+        pooled.uses += 1
+        return pooled
+
+    async def release(self, pooled: PooledContainer):
+
+        """reset the container and put it back into the pool"""
+
+        if pooled.healthy:
+            try:
+                await self.exec_to_end(pooled, RESET_CMD)
+            except aiodocker.DockerError:
+                pooled.healthy = False
+        await asyncio.to_thread(clear_workspace, pooled.workspace)
+        await asyncio.to_thread(clear_workspace, pooled.input_dir)
+
+        idle = self.idle.setdefault(pooled.image_name, [])
+        if not pooled.healthy or pooled.uses >= settings.pool_max_uses \
+        or len(idle) >= settings.pool_max_idle:
+            await self.discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        idle.append(pooled)
+
+    async def discard(self, pooled: PooledContainer):
+
+        """remove the container, its workspace and its inputs"""
+
+        try:
+            await pooled.container.delete(force=True)
+        except aiodocker.DockerError:
+            pool_logger.warning(f'failed to delete the pooled container {pooled.container.id}')
+        await remove_workspace(pooled.workspace)
+        await remove_workspace(pooled.input_dir)
+
+    async def exec_to_end(self, pooled: PooledContainer, cmd: list[str]) -> dict[str, Any]:
+
+        """run a command in the container and wait until it ends"""
+
+        exec_instance = await pooled.container.exec(cmd=cmd, stdout=True, stderr=True)
+        async with exec_instance.start(detach=False) as stream:
+            while await stream.read_out() is not None:
+                pass
+        return await exec_instance.inspect()
+
+    async def is_healthy(self, pooled: PooledContainer) -> bool:
+
+        """check if the container is still running"""
+
+        try:
+            info = await pooled.container.show()
+        except aiodocker.DockerError:
+            return False
+        return info['State']['Running']
+
+    async def maintain(self):
+
+        """evict idle containers, drop the unhealthy ones, and refill the pool"""
+
+        while True:
+            await asyncio.sleep(settings.pool_health_interval)
+            now = time.monotonic()
+            for image_name, idle in list(self.idle.items()):
+                keep = []
+                for pooled in list(idle):
+                    expired = now - pooled.last_used > settings.pool_idle_timeout \
+                        and len(keep) >= settings.pool_min_idle
+                    healthy = not expired and await self.is_healthy(pooled)
+                    if pooled not in idle:
+                        # borrowed during the health check
+                        continue
+                    if healthy:
+                        keep.append(pooled)
+                    else:
+                        idle.remove(pooled)
+                        await self.discard(pooled)
+                await self.fill(image_name)
+
+def run_user_ids() -> tuple[int, int]:
+
+    """the uid and the gid of the pool run user"""
+
+    uid, _, gid = settings.pool_run_user.partition(':')
+    return int(uid), int(gid or uid)
+
+def clear_workspace(workspace: str):
+
+    """remove everything in the workspace but keep the directory"""
+
+    for entry in os.scandir(workspace):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
+
+async def link_input(input_file: str, dst: str):
+
+    """link the input from the testcase store, or copy it in a thread if it cannot be linked
+
+    The link shares the file of the store, so it is only bound read-only.
+    """
+
+    try:
+        os.remove(dst)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(input_file, dst)
+    except OSError:
+        await asyncio.to_thread(shutil.copyfile, input_file, dst)
+
+def copy_into_workspace(src_dir: str, workspace: str):
+
+    """link (or copy) the files of the submission into the workspace"""
+
+    for entry in os.scandir(src_dir):
+        if not entry.is_file():
+            continue
+        dst = os.path.join(workspace, entry.name)
+        try:
+            os.link(entry.path, dst)
+        except OSError:
+            shutil.copy2(entry.path, dst)
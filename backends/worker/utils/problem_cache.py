@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import logging
+import asyncio
+from redis.asyncio import Redis as aioredis
+from shared.models import Problem
+from shared.db import problem_db
+from shared.utils import oj_cache
+
+problem_cache_logger = logging.getLogger('problem_cache')
+
+class ProblemCache:
+
+    """an LRU cache of the problems loaded by the worker
+
+    The entries are keyed by the problem id and checked against the version
+    of the problem in the database, which is much cheaper than loading the
+    problem. The api also publishes the changed problems, so the stale
+    entries are dropped before they are even looked up.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[str, Problem] = OrderedDict()
+        self.listener: asyncio.Task | None = None
+
+    async def get(self, problem_id: str) -> Problem | None:
+
+        """get the problem from the cache or the database"""
+
+        exists, version = await problem_db.get_problem_version(problem_id)
+        if not exists:
+            self.invalidate(problem_id)
+            return None
+        cached = self.entries.get(problem_id)
+        if cached is not None and cached.version == version:
+            self.entries.move_to_end(problem_id)
+            return cached
+
+        problem_cache_logger.debug(f'problem {problem_id} (version {version}) loaded')
+        problem = await problem_db.get_problem_by_id(problem_id)
+        if problem is None:
+            return None
+        self.entries[problem_id] = problem
+        self.entries.move_to_end(problem_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return problem
+
+    def invalidate(self, problem_id: str | None = None):
+
+        """drop a problem, or all problems if no id is given"""
+
+        if problem_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(problem_id, None)
+
+    def start(self, redis: aioredis):
+
+        """start listening to the problem changes published by the api"""
+
+        self.listener = asyncio.create_task(
+            oj_cache.listen_changes(redis, oj_cache.PROBLEM_CHANNEL, self.invalidate)
+        )
+
+    async def stop(self):
+
+        """stop listening to the problem changes"""
+
+        if self.listener is not None:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
@@ -0,0 +1,114 @@
+from typing import Callable
+from dataclasses import dataclass
+import logging
+import threading
+import uuid
+import psutil
+from ..core.config import settings
+
+sampler_logger = logging.getLogger('sampler')
+
+@dataclass
+class WatchedRun:
+
+    """a running process tree and the memory peaks recorded for it"""
+
+    process: psutil.Process | None             # None if the process had exited
+    peaks: list[int]                           # MB, one for each phase
+    phase: Callable[[], int] | None = None     # returns the index of the current phase
+
+class ResourceSampler:
+
+    """one thread sampling the memory of all running judge processes
+
+    Each run registers the pid of its container (or exec) process with
+    watch(), and reads its peaks with unwatch() when it finishes. Every
+    sweep walks the process trees of all registered runs, so the cost does
+    not grow with the number of asyncio tasks, and the psutil calls never
+    block the event loop of the worker.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.runs: dict[str, WatchedRun] = {}
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def start(self):
+
+        """start the sampling thread"""
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name='resource-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        """stop the sampling thread"""
+
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def watch(self, pid: int, phases: int = 1, phase: Callable[[], int] | None = None) -> str:
+
+        """start watching the process tree of the pid
+
+        This function returns the token for unwatch(). If the process has
+        already exited, nothing is watched and the peaks stay zero.
+        """
+
+        token = uuid.uuid4().hex
+        try:
+            process = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            process = None
+        with self.lock:
+            self.runs[token] = WatchedRun(process=process, peaks=[0] * phases, phase=phase)
+        return token
+
+    def unwatch(self, token: str) -> list[int]:
+
+        """stop watching the run and return its memory peaks"""
+
+        with self.lock:
+            run = self.runs.pop(token)
+        return run.peaks
+
+    def loop(self):
+
+        """sweep all watched runs until stopped"""
+
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                runs = list(self.runs.values())
+            for run in runs:
+                try:
+                    self.sample(run)
+                except psutil.Error:
+                    # the process has exited between two sweeps
+                    continue
+                except Exception as e:
+                    sampler_logger.warning(f'failed to sample a run: {e}')
+
+    def sample(self, run: WatchedRun):
+
+        """record the largest rss in the process tree of the run"""
+
+        if run.process is None:
+            return
+        index = run.phase() if run.phase is not None else 0
+        if index >= len(run.peaks):
+            return
+        processes = [run.process, *run.process.children(recursive=True)]
+        rss = 0
+        for process in processes:
+            try:
+                rss = max(rss, process.memory_info().rss)
+            except psutil.NoSuchProcess:
+                continue
+        run.peaks[index] = max(run.peaks[index], rss // 1024 ** 2)
+
+resource_sampler = ResourceSampler(settings.sampler_interval)
@@ -0,0 +1,167 @@
+from typing import NamedTuple
+from collections import OrderedDict
+import logging
+import os
+import uuid
+import aiofiles
+from shared.models import Problem
+from shared.schemas import ProbCase
+from shared.db import problem_db
+from shared.utils import problem_parse
+from ..core.config import settings
+
+store_logger = logging.getLogger('testcase_store')
+
+# the store in the worker, which is never bound as a whole in the judge containers
+STORE_DIR = os.path.join(settings.judge_dir, 'testcases')
+
+class StoredCase(NamedTuple):
+
+    """the paths of a testcase in the store of the worker
+
+    Only the input is given to the run, and the answer only to the checker.
+    """
+
+    input_file: str
+    answer_file: str
+
+class TestcaseStore:
+
+    """a content-addressed store of the testcase files on the local disk
+
+    Each input (with the trailing newline fed to the program) and each
+    expected output is written once under the hash of its content (the
+    key in the manifest of the problem), so the submissions of a problem
+    share the same files. The inputs and the outputs are kept apart by
+    the prefix of their entries, since the same text is not stored with
+    the same bytes. The entries are evicted in LRU order once the total
+    size exceeds the limit, except the ones pinned by the submissions
+    being judged.
+    """
+
+    def __init__(self, store_dir: str, max_size: int):
+        self.store_dir = store_dir
+        self.max_size = max_size
+        self.entries: OrderedDict[str, int] = OrderedDict() # key -> size in bytes
+        self.total_size = 0
+        self.pins: dict[str, int] = {}  # key -> number of submissions using it
+        os.makedirs(store_dir, exist_ok=True)
+        # the answers of every problem are here, so only the worker may read them
+        os.chmod(store_dir, 0o700)
+        self.load()
+
+    def load(self):
+
+        """rebuild the LRU index from the files already on the disk
+
+        The files without a prefix, left by older versions of the store,
+        are removed.
+        """
+
+        found = []
+        for entry in os.scandir(self.store_dir):
+            if not entry.is_file() or entry.name.startswith('tmp-'):
+                continue
+            if not entry.name.startswith(('in-', 'ans-')):
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_size += size
+
+    def has(self, key: str) -> bool:
+
+        """check if the entry is in the store, marking it as recently used"""
+
+        if key not in self.entries or not os.path.exists(os.path.join(self.store_dir, key)):
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    async def put(self, key: str, content: str):
+
+        """store the content under the key if it is not stored yet"""
+
+        if self.has(key):
+            return
+        data = content.encode()
+        tmp_path = os.path.join(self.store_dir, f'tmp-{uuid.uuid4().hex}')
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(data)
+        # the rename is atomic, so a run never reads a partial file
+        os.rename(tmp_path, os.path.join(self.store_dir, key))
+        if key not in self.entries:
+            self.total_size += len(data)
+        self.entries[key] = len(data)
+
+    def pin(self, key: str):
+
+        """keep the entry from being evicted"""
+
+        self.pins[key] = self.pins.get(key, 0) + 1
+
+    async def materialize(self, problem: Problem) -> list[StoredCase]:
+
+        """store the inputs and the expected outputs of the testcases of the problem
+
+        With a manifest, a testcase is only loaded from the database if its
+        files are not in the store yet. The entries stay pinned until
+        release() is called with the result.
+        """
+
+        manifest = problem_parse.has_manifest(problem)
+        stored = []
+        try:
+            for index, entry in enumerate(problem.testcases):
+                if manifest:
+                    input_hash, answer_hash = entry['input_key'], entry['output_key']
+                else:
+                    input_hash = problem_parse.testcase_key(entry['input'])
+                    answer_hash = problem_parse.testcase_key(entry['output'])
+                input_key, answer_key = f'in-{input_hash}', f'ans-{answer_hash}'
+                self.pin(input_key)
+                self.pin(answer_key)
+                stored.append(StoredCase(
+                    input_file=os.path.join(self.store_dir, input_key),
+                    answer_file=os.path.join(self.store_dir, answer_key),
+                ))
+                if self.has(input_key) and self.has(answer_key):
+                    continue
+                case = await problem_db.get_testcase(problem, index) if manifest else ProbCase(**entry)
+                await self.put(input_key, f'{case.input}\n')
+                await self.put(answer_key, case.output)
+        except BaseException:
+            self.release(stored)
+            raise
+        self.evict()
+        return stored
+
+    def release(self, stored: list[StoredCase]):
+
+        """unpin the entries of the testcases"""
+
+        for case in stored:
+            for path in case:
+                key = os.path.basename(path)
+                self.pins[key] -= 1
+                if self.pins[key] == 0:
+                    del self.pins[key]
+
+    def evict(self):
+
+        """evict the least recently used entries that are not pinned until the store fits"""
+
+        for key in list(self.entries):
+            if self.total_size <= self.max_size:
+                break
+            if key in self.pins:
+                continue
+            size = self.entries.pop(key)
+            self.total_size -= size
+            try:
+                os.remove(os.path.join(self.store_dir, key))
+            except FileNotFoundError:
+                pass
+            store_logger.debug(f'testcase file {key} evicted')
@@ -0,0 +1,51 @@
+import logging
+import asyncio
+import os
+import shutil
+from ..core.config import settings
+
+workspace_logger = logging.getLogger('workspace')
+
+async def run_cmd(*cmd: str) -> bool:
+
+    """run a command of the worker and return true if it succeeds"""
+
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        workspace_logger.warning(f'{" ".join(cmd)} failed: {stderr.decode().strip()}')
+    return process.returncode == 0
+
+async def make_workspace(path: str):
+
+    """create the directory of a workspace
+
+    If the tmpfs workspaces are enabled, a size-limited tmpfs is mounted on
+    the directory, and the mount reaches the docker host through the shared
+    propagation of the judge directory. If the mount fails, the workspace
+    stays on the disk.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    if settings.workspace_tmpfs and not os.path.ismount(path):
+        await run_cmd(
+            'mount', '-t', 'tmpfs',
+            '-o', f'size={settings.workspace_tmpfs_size}m,mode=0755',
+            'tmpfs', path,
+        )
+
+async def remove_workspace(path: str):
+
+    """remove the workspace without blocking the event loop
+
+    A tmpfs workspace is lazily unmounted, which drops its files at once,
+    and a workspace on the disk is removed in a thread.
+    """
+
+    if os.path.ismount(path):
+        await run_cmd('umount', '-l', path)
+    await asyncio.to_thread(shutil.rmtree, path, True)
@@ -14,3 +14,7 @@ class OJSettings:
     on_shutdown = judge.shutdown
     redis_settings = REDIS_SETTINGS
     max_jobs = settings.max_jobs
+    job_timeout = settings.job_timeout
+    # only take as many jobs as can start, so the jobs of a higher lane
+    # queued meanwhile are not stuck behind a long read of lower ones
+    queue_read_limit = settings.max_jobs